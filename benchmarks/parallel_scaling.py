@@ -0,0 +1,68 @@
+'''
+how the process pool path of map_windows scales with worker count
+
+runs the batched rebalancing simulation over a synthetic return matrix with 1, 2, 4, ... workers
+(up to the cpus available, or the counts given with --workers) and checks every run matches serial
+usage: python benchmarks/parallel_scaling.py [--years 100] [--allocations 2000] [--workers 1 2 4 8]
+'''
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from returns_engine import default_workers, map_windows, rebalanced_chunk, rolling_windows
+
+
+def synthetic_growth(months, assets, seed=0):
+    '''
+    returns (months x assets) growth factors drawn around 0.7% +/- 4% a month
+    '''
+    rng = np.random.default_rng(seed)
+    return 1 + rng.normal(0.007, 0.04, size=(months, assets))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, default=100)
+    parser.add_argument("--assets", type=int, default=5)
+    parser.add_argument("--allocations", type=int, default=2000)
+    parser.add_argument("--length", type=int, default=25, help="rolling period length in years")
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--workers", type=int, nargs="*", default=None)
+    args = parser.parse_args()
+
+    growth = synthetic_growth(args.years * 12, args.assets)
+    weights = np.random.default_rng(1).dirichlet(np.ones(args.assets), size=args.allocations)
+    schedules = ["none", "monthly", "quarterly", "annual"]
+    starts, window_rows = rolling_windows(len(growth), [args.length * 12])
+    task_args = (weights, schedules, 10)
+
+    worker_counts = args.workers
+    if not worker_counts:
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= default_workers():
+            worker_counts.append(worker_counts[-1] * 2)
+
+    print("{} windows x {} allocations x {} schedules, {} cpus available".format(
+        len(starts), args.allocations, len(schedules), default_workers()))
+    print("{:>8} {:>10} {:>8} {:>10}".format("workers", "seconds", "speedup", "identical"))
+
+    start = time.perf_counter()
+    serial = map_windows(rebalanced_chunk, growth, (starts, window_rows), task_args)
+    serial_time = time.perf_counter() - start
+    print("{:>8} {:>10.3f} {:>8.2f} {:>10}".format("serial", serial_time, 1.0, "yes"))
+
+    for workers in worker_counts:
+        start = time.perf_counter()
+        cube = map_windows(rebalanced_chunk, growth, (starts, window_rows), task_args, workers, args.chunk_size)
+        elapsed = time.perf_counter() - start
+        print("{:>8} {:>10.3f} {:>8.2f} {:>10}".format(workers, elapsed, serial_time / elapsed,
+            "yes" if np.array_equal(cube, serial, equal_nan=True) else "NO"))
+
+
+if __name__ == "__main__":
+    main()
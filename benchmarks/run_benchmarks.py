@@ -0,0 +1,289 @@
+'''
+benchmark suite for the return engine and the rebalance / growth_value scripts
+
+each scenario writes a synthetic return csv (see synthetic.py), then times loading and the rolling
+comparisons in a fresh child process, so its peak RSS is its own. cold start (interpreter plus imports, and a
+whole command line run of each script) is timed in new processes before the scenarios. results are written
+as json; pass an earlier results file with --compare to flag stages that got slower.
+
+usage: python benchmarks/run_benchmarks.py [--quick] [--scenarios monthly-50y-5 ...] [--output results.json]
+           [--compare old.json] [--threshold 0.2] [--no-cold-start]
+'''
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+from synthetic import write_synthetic_csv
+
+
+#form (name, frequency, years of history, asset columns)
+SCENARIOS = [
+    ("monthly-50y-5", "monthly", 50, 5),
+    ("monthly-100y-20", "monthly", 100, 20),
+    ("monthly-100y-200", "monthly", 100, 200),
+    ("daily-50y-5", "daily", 50, 5),
+    ("daily-100y-50", "daily", 100, 50),
+    ("daily-100y-200", "daily", 100, 200),
+]
+
+QUICK_SCENARIOS = ["monthly-50y-5", "monthly-100y-20", "daily-50y-5"]
+
+PERIODS_PER_YEAR = {"monthly": 12, "daily": 252}
+
+#modules a plain run should never import, reported if importing the scripts pulls them in
+HEAVY_MODULES = ["matplotlib", "pandas", "pyarrow", "scipy"]
+
+
+def timed(fn, repeat=1):
+    '''
+    returns (best wall time in seconds over repeat calls, result of the last call)
+    '''
+    best = None
+    for attempt in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_scenario(path, frequency, assets, repeat):
+    '''
+    times every stage for one synthetic file, in this process
+    returns dict of {"timings": {stage: seconds}, "windows": {stage: count}, "windows_per_sec": {...}}
+    '''
+    from returns_engine import (ReturnCache, end_values_chunk, load_return_store, rolling_end_values,
+        simulate_rebalanced, simulate_rebalanced_calendar)
+    from returns_engine import store as store_module
+    import growth_value
+    import rebalance
+
+    timings = {}
+    windows = {}
+
+    def cold(fn):
+        #forget stores parsed earlier in this process
+        def run():
+            store_module._loaded.clear()
+            return fn()
+        return run
+
+    timings["parse_csv"], store = timed(cold(lambda: load_return_store(path, assets, disk_cache=False)), repeat)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ReturnCache(cache_dir)
+        timings["disk_cache_write"], result = timed(cold(lambda: load_return_store(path, assets, cache)))
+        timings["disk_cache_load"], result = timed(cold(lambda: load_return_store(path, assets, cache)), repeat)
+
+    os.environ["RETURNS_ENGINE_CACHE_DIR"] = "off"
+    timings["get_return_data"], result = timed(cold(lambda: rebalance.ReturnData(path).get_return_data()), repeat)
+
+    #the scripts end to end, for every frequency: daily files get calendar windows starting on every row
+    periods_per_year = PERIODS_PER_YEAR[frequency]
+    data = rebalance.ReturnData(path)
+    data.get_return_store()
+
+    def rolling_periods():
+        data.rolling_periods = None
+        return data.get_rolling_periods(25)
+    timings["get_rolling_periods"], periods = timed(rolling_periods, repeat)
+    windows["get_rolling_periods"] = len(periods)
+
+    sample = periods[::max(1, len(periods) // 20)]
+    timings["period_value_comparison"], result = timed(
+        lambda: [rebalance.period_value_comparison(10, period, data) for period in sample], repeat)
+    windows["period_value_comparison"] = len(sample)
+
+    timings["rolling_pd_comparison_rebalance"], result = timed(
+        lambda: rebalance.rolling_pd_comparison(10, path), repeat)
+    windows["rolling_pd_comparison_rebalance"] = len(result)
+
+    #growth_value reads every column named in the header
+    timings["rolling_pd_comparison_growth_value"], result = timed(
+        lambda: growth_value.rolling_pd_comparison(10, path), repeat)
+    windows["rolling_pd_comparison_growth_value"] = sum(len(table) - 1 for table in result)
+
+    #engine over every asset column, windows measured in rows of the file's frequency
+    lengths = [length * periods_per_year for length in (5, 10, 20)]
+    timings["engine_end_values"], result = timed(
+        lambda: rolling_end_values(store.growth, lengths, 10, store.log_prefix()), repeat)
+    windows["engine_end_values"] = len(result[1])
+
+    weights = np.random.default_rng(0).dirichlet(np.ones(assets), size=16)
+    starts = np.arange(max(len(store) - lengths[1] + 1, 0))
+    timings["engine_rebalanced"], result = timed(lambda: simulate_rebalanced(store.growth, weights,
+        ["none", "monthly" if frequency == "monthly" else 21, "annual" if frequency == "monthly" else 252],
+        starts, lengths[1], 10, store.log_prefix()), repeat)
+    windows["engine_rebalanced"] = len(starts)
+
+    if frequency != "monthly":
+        #calendar windows: 10 years starting on every row, rebalanced on month boundaries
+        calendar = store.calendar
+        timings["calendar_windows"], result = timed(lambda: calendar.calendar_windows([5, 10, 20]), repeat)
+        windows["calendar_windows"] = len(result[0])
+        timings["engine_calendar_end_values"], result = timed(
+            lambda: end_values_chunk(store.growth, store.log_prefix(), result[0], result[1], 10), repeat)
+        windows["engine_calendar_end_values"] = len(result)
+
+        starts, lengths = calendar.calendar_windows([10])
+        timings["engine_calendar_rebalanced"], result = timed(lambda: simulate_rebalanced_calendar(store.growth,
+            weights, ["none", "monthly", "annual"], starts, lengths, calendar.month_ordinals, 10,
+            store.log_prefix()), repeat)
+        windows["engine_calendar_rebalanced"] = len(starts)
+
+    return {
+        "rows": len(store),
+        "assets": assets,
+        "frequency": frequency,
+        "timings": timings,
+        "windows": windows,
+        "windows_per_sec": {stage: count / timings[stage] for stage, count in windows.items() if timings[stage] > 0},
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def cold_start(path, repeat):
+    '''
+    input: path (a synthetic monthly csv with 6 or more asset columns), repeat (int)
+    times new python processes from launch to exit, best of repeat each, so interpreter startup and
+    imports are included as a user or a spawned worker would see them
+    returns dict of {"timings": {stage: seconds}, "heavy_modules": [modules of HEAVY_MODULES imported]}
+    '''
+    environment = dict(os.environ, RETURNS_ENGINE_CACHE_DIR="off")
+    commands = {
+        "python_startup": [sys.executable, "-c", "pass"],
+        "import_returns_engine": [sys.executable, "-c", "import returns_engine"],
+        "import_rebalance": [sys.executable, "-c", "import rebalance"],
+        "import_growth_value": [sys.executable, "-c", "import growth_value"],
+        "cli_rebalance": [sys.executable, "rebalance.py", path, "--length", "25", "--quiet"],
+        "cli_growth_value": [sys.executable, "growth_value.py", path, "--quiet"],
+    }
+
+    timings = {}
+    for stage, command in commands.items():
+        timings[stage], result = timed(lambda: subprocess.run(command, check=True, cwd=REPO_DIR, env=environment,
+            stdout=subprocess.DEVNULL), repeat)
+
+    loaded = subprocess.run([sys.executable, "-c", "import json, sys, rebalance, growth_value; "
+        "print(json.dumps(sorted(set(name.split('.')[0] for name in sys.modules))))"], check=True, cwd=REPO_DIR,
+        stdout=subprocess.PIPE).stdout
+    return {"timings": timings, "heavy_modules": sorted(set(json.loads(loaded)) & set(HEAVY_MODULES))}
+
+
+def compare(results, baseline, threshold):
+    '''
+    prints stages at least threshold (fraction) slower than in baseline, returns number of regressions
+    '''
+    regressions = 0
+    scenarios = dict(results["scenarios"])
+    if "cold_start" in results:
+        scenarios["cold-start"] = results["cold_start"]
+    baseline = dict(baseline, scenarios=dict(baseline.get("scenarios", {}), **(
+        {"cold-start": baseline["cold_start"]} if "cold_start" in baseline else {})))
+    for name, scenario in scenarios.items():
+        old = baseline["scenarios"].get(name)
+        if old is None:
+            continue
+        for stage, seconds in scenario["timings"].items():
+            old_seconds = old["timings"].get(stage)
+            if old_seconds and seconds > old_seconds * (1 + threshold):
+                regressions += 1
+                print("REGRESSION {} {}: {:.4f}s -> {:.4f}s ({:+.0%})".format(
+                    name, stage, old_seconds, seconds, seconds / old_seconds - 1))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="*", default=None, help="scenario names to run (default all)")
+    parser.add_argument("--quick", action="store_true", help="only run " + ", ".join(QUICK_SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=1, help="report the best of this many runs per stage")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "returns_engine_bench"),
+        help="where synthetic csvs are written and reused")
+    parser.add_argument("--output", default=None, help="json results path (default benchmarks/results/<time>.json)")
+    parser.add_argument("--compare", default=None, help="earlier json results to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown fraction counted as a regression")
+    parser.add_argument("--no-cold-start", action="store_true", help="skip timing startup in new processes")
+    parser.add_argument("--child", nargs=4, metavar=("PATH", "FREQUENCY", "ASSETS", "REPEAT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        path, frequency, assets, repeat = args.child
+        json.dump(run_scenario(path, frequency, int(assets), int(repeat)), sys.stdout)
+        return
+
+    names = args.scenarios or (QUICK_SCENARIOS if args.quick else [scenario[0] for scenario in SCENARIOS])
+    unknown = set(names) - set(scenario[0] for scenario in SCENARIOS)
+    if unknown:
+        parser.error("unknown scenarios: {}".format(", ".join(sorted(unknown))))
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "scenarios": {},
+    }
+
+    if not args.no_cold_start:
+        #the smallest scenario's file, which has enough columns for both scripts
+        path = os.path.join(args.data_dir, "monthly-50y-5-cold.csv")
+        if not os.path.exists(path):
+            write_synthetic_csv(path, 50, 6, "monthly")
+        results["cold_start"] = cold_start(path, max(args.repeat, 3))
+        print("cold start (best of {}, new process each)".format(max(args.repeat, 3)))
+        for stage, seconds in results["cold_start"]["timings"].items():
+            print("  {:<38} {:>10.4f}s".format(stage, seconds))
+        if results["cold_start"]["heavy_modules"]:
+            print("  importing the scripts loads " + ", ".join(results["cold_start"]["heavy_modules"]))
+
+    for name, frequency, years, assets in SCENARIOS:
+        if name not in names:
+            continue
+        path = os.path.join(args.data_dir, name + ".csv")
+        if not os.path.exists(path):
+            write_synthetic_csv(path, years, assets, frequency)
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", path, frequency, str(assets),
+            str(args.repeat)], check=True, stdout=subprocess.PIPE, cwd=REPO_DIR).stdout
+        scenario = json.loads(output)
+        results["scenarios"][name] = scenario
+
+        print("{} ({} rows x {} assets, peak rss {:.0f} MB)".format(name, scenario["rows"], assets,
+            scenario["peak_rss_mb"]))
+        for stage, seconds in scenario["timings"].items():
+            rate = scenario["windows_per_sec"].get(stage)
+            print("  {:<38} {:>10.4f}s{}".format(stage, seconds,
+                "" if rate is None else "  {:>14,.0f} windows/s".format(rate)))
+
+    output = args.output
+    if output is None:
+        os.makedirs(os.path.join(BENCHMARK_DIR, "results"), exist_ok=True)
+        output = os.path.join(BENCHMARK_DIR, "results", datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print("results written to " + output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(results, json.load(f), args.threshold):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
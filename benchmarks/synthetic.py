@@ -0,0 +1,90 @@
+'''
+synthetic return exports in the layout ReturnData reads: blank first column, m/d/yyyy date in column 1,
+percent returns for each asset after it, an alphabetic header row and a blank row before the data
+
+usage: python benchmarks/synthetic.py out.csv --years 50 --assets 5 [--frequency daily]
+'''
+import argparse
+import csv
+
+import numpy as np
+
+
+def business_days(start_year, years):
+    '''
+    returns datetime64[D] array of weekdays from Jan 1 start_year through Dec 31 of the last year
+    '''
+    days = np.arange(np.datetime64("{}-01-01".format(start_year)), np.datetime64("{}-01-01".format(start_year + years)))
+    #1970-01-01 was a thursday, so (days + 3) % 7 is 0 on mondays
+    return days[(days.astype(np.int64) + 3) % 7 < 5]
+
+
+def month_end_business_days(start_year, years):
+    '''
+    returns datetime64[D] array with the last weekday of every month
+    '''
+    days = business_days(start_year, years)
+    months = days.astype("datetime64[M]")
+    last = np.append(months[1:] != months[:-1], True)
+    return days[last]
+
+
+def format_dates(days):
+    '''
+    returns lst of m/d/yyyy strings for a datetime64[D] array
+    '''
+    years = days.astype("datetime64[Y]").astype(np.int64) + 1970
+    months = days.astype("datetime64[M]").astype(np.int64) % 12 + 1
+    day_of_month = (days - days.astype("datetime64[M]")).astype(np.int64) + 1
+    return ["{}/{}/{}".format(month, day, year) for year, month, day in
+        zip(years.tolist(), months.tolist(), day_of_month.tolist())]
+
+
+def synthetic_returns(rows, assets, frequency="monthly", seed=0):
+    '''
+    returns (rows x assets) percent returns, correlated across assets, scaled to the frequency
+    '''
+    rng = np.random.default_rng(seed)
+    periods_per_year = 12 if frequency == "monthly" else 252
+    mean = rng.uniform(4, 12, size=assets) / periods_per_year
+    vol = rng.uniform(3, 25, size=assets) / np.sqrt(periods_per_year)
+    market = rng.standard_normal((rows, 1))
+    own = rng.standard_normal((rows, assets))
+    return mean + vol * (0.6 * market + 0.8 * own)
+
+
+def write_synthetic_csv(path, years=50, assets=5, frequency="monthly", start_year=1950, seed=0):
+    '''
+    writes a synthetic return export to path, returns number of data rows
+    '''
+    if frequency == "monthly":
+        days = month_end_business_days(start_year, years)
+    else:
+        days = business_days(start_year, years)
+    dates = format_dates(days)
+    returns = synthetic_returns(len(dates), assets, frequency, seed)
+
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["", "Date"] + ["IDX{}".format(asset) for asset in range(assets)])
+        writer.writerow([""] * (assets + 2))
+        for date, row in zip(dates, returns.round(4).tolist()):
+            writer.writerow(["", date] + row)
+    return len(dates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--years", type=int, default=50)
+    parser.add_argument("--assets", type=int, default=5)
+    parser.add_argument("--frequency", choices=["monthly", "daily"], default="monthly")
+    parser.add_argument("--start-year", type=int, default=1950)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rows = write_synthetic_csv(args.path, args.years, args.assets, args.frequency, args.start_year, args.seed)
+    print("wrote {} rows x {} assets to {}".format(rows, args.assets, args.path))
+
+
+if __name__ == "__main__":
+    main()
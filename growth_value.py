@@ -1,153 +1,56 @@
-import csv
-import matplotlib.pyplot as plt
+import argparse
+import json
+import numpy as np
 
-class ReturnData(object):
-    def __init__(self, filename):
-        self.filename = filename
-        self.ordered_dates = None
-        self.rolling_periods = None
-        self.rolling_period_length = None
+import returns_engine
+from returns_engine import RollingSummary, cli, instrument, iter_rolling_values, open_sink, rolling_values
 
-    def get_return_data(self):
-        '''
-        reads data from csv file containing historical data for total returns, value, and asset
-        allocations for unbalanced, monthly rebalanced, and annually rebalanced portfolio.
-        '''
-        #initialize dict for date and list of monthly returns, ordered list of dates
-        # dict form {date: [large cap, small cap, international equity, bonds, cash]}
-        return_dict = {}
-
-        #read csv
-        with open(self.filename) as rebal:
-            for row in csv.reader(rebal):
-                if row[1].isalpha() or row[1] == '':
-                    continue
-                else:
-                    date = row[1]
-                    lcg = row[2]
-                    lcv = row[3]
-                    mcg = row[4]
-                    mcv = row[5]
-                    scg = row[6]
-                    scv = row[7]
-
-                #add data to dict, list
-                return_dict[date] = [lcg, lcv, mcg, mcv, scg, scv]
-
-        return return_dict
-
-    def get_ordered_dates(self):
-        if self.ordered_dates is not None:
-            return self.ordered_dates
-        else:
-            ordered_dates = []
-            #read csv
-            with open(self.filename) as f:
-                for row in csv.reader(f):
-                    if not(row[1].isalpha()) and not(row[1] == ''):
-                        date = row[1]
-                        ordered_dates.append(date)
-            self.ordered_dates = ordered_dates
-            return self.ordered_dates
-
-    def beginning_of_month(self, your_date):
-        if your_date[1] == "/":
-            return your_date[:1] + "/1/" + your_date[-4:]
-        if your_date[2] == "/":
-            return your_date[:2] + "/1/" + your_date[-4:]
-
-    def end_of_month(self, your_date, ordered_dates):
-        '''
-        input m/yyyy (str), last business day of months (lst)
-        return last business day of given month
-        '''
-        for date in ordered_dates:
-            if date[-4:] == your_date[-4:] and date[:2] == your_date[:2]:
-                return date
+class ReturnData(returns_engine.ReturnData):
+    #every index named in the header (lcg, lcv, mcg, mcv, scg, scv in the export), in file order
+    asset_columns = None
 
-    def get_rolling_periods(self, length):
-        '''
-        input: length of each rolling period in months (int)
-        returns rolling periods in list of tuples
-        '''
-        if self.rolling_periods is not None and self.rolling_period_length == length:
-            return self.rolling_periods
-        else:
-            ordered_dates = self.get_ordered_dates()
-            rolling_periods = []
-            total_month_count = len(ordered_dates)
-            for i in range (0, total_month_count-(((length-1)*12)+11)):
-                start = self.beginning_of_month(ordered_dates[i])
-                end = ordered_dates[i+((length-1)*12)+11]
-                rolling_periods.append((start,end))
-            self.rolling_periods = rolling_periods
-            return self.rolling_periods
-
-
-class Portfolio(ReturnData):
+
+class Portfolio(returns_engine.Portfolio, ReturnData):
     '''
-    attributes: starting_value, proportion of equities, bonds, cash
+    attributes: starting_value (total over every index), start_value in each index, weighted equally
+        (the target proportions should the inherited rebalancing methods be used), starting_port
     '''
 
-    def __init__(self, start_value, filename):
-        self.starting_value = start_value
-        ReturnData.__init__(self, filename)
-        self.starting_port = [self.starting_value,self.starting_value,self.starting_value,self.starting_value,self.starting_value,self.starting_value]
+    def __init__(self, start_value, filename, return_store=None):
+        ReturnData.__init__(self, filename, return_store)
+        columns = len(self.get_columns())
+        returns_engine.Portfolio.__init__(self, start_value * columns, np.full(columns, 1.0 / columns), filename,
+            self.get_return_store())
+        self.starting_port = [start_value] * columns
 
-    
-    def date_range(self, start_of_period, end_of_period):
+    def simulate_indices(self, starting_portfolio, date_range, path=False):
         '''
-        inputs: start_of_period (str, m/d/yyyy), end_of_period
-        returns ordered list of all dates in date range
+        inputs: starting_portfolio (lst, starting value of each index in get_columns() order),
+            date_range (ordered lst of dates in focus range), path (bool)
+        returns final values (lst, same form as starting_portfolio); with path=True returns
+            (final values, array of values after every month of date_range, shape (len(date_range) x indices))
         '''
-        ordered_dates = self.get_ordered_dates()
-
-        end_date_range = ordered_dates[ordered_dates.index(start_of_period): ordered_dates.index(end_of_period)]
-        end_date_range.append(end_of_period)
-        date_range = [self.beginning_of_month(start_of_period)]
-        date_range.extend(end_date_range)
-
-        return date_range
-
-    def get_months_returns(self, date, date_range, portfolio):
-        '''
-        gets the new portfolio value for a single month, month date_range[date]
-        '''
-        return_dict = self.get_return_data()
-        lcg = ((float(return_dict[date_range[date]][0])/100)+1) * portfolio[date_range[date-1]][0]
-        lcv = ((float(return_dict[date_range[date]][1])/100)+1) * portfolio[date_range[date-1]][1]
-        mcg = ((float(return_dict[date_range[date]][2])/100)+1) * portfolio[date_range[date-1]][2]
-        mcv = ((float(return_dict[date_range[date]][3])/100)+1) * portfolio[date_range[date-1]][3]
-        scg = ((float(return_dict[date_range[date]][4])/100)+1) * portfolio[date_range[date-1]][4]
-        scv = ((float(return_dict[date_range[date]][5])/100)+1) * portfolio[date_range[date-1]][5]
-
-        return [lcg, lcv, mcg, mcv, scg, scv]
-
+        #the shared simulation carries a total in front, which is not part of this portfolio's values
+        result = returns_engine.Portfolio.simulate(self, [sum(starting_portfolio)] + list(starting_portfolio),
+            date_range, path=path)
+        if path:
+            final, values = result
+            return final[1:], values[:, 1:]
+        return result[1:]
 
     def untouched_returns(self, starting_portfolio, date_range):
         '''
-        inputs: starting_portfolio (lst, form [starting val, lc val, sc val, int val, bond val, cash val]),
-            return_dict (dict, form {date:[<same form as starting_portfolio>]}
+        inputs: starting_portfolio (lst, starting value of each index in get_columns() order),
             date_range (ordered lst of dates in focus range)
-        returns dict of monthly return data for unbalanced portfolio
+        returns dict of monthly values for each index, form {date: [value of each index]}
+        (use simulate_indices when only the final values are needed)
         '''
-        #initialize dict of monthly values of untouched portfolio, filled with starting port value
-        # form {date: [value]}
-        port = {date_range[0]: self.starting_port}
-
-        #populate port value dict, starting range at 1 bc we have the starting port for values resulting from date_range[0]
-        for date in range(1, len(date_range)):
-            new_entry = self.get_months_returns(date, date_range, port)
-            port[date_range[date]] = new_entry
-
-        #return final dict with all port values for all months in pd
-        return port
+        final, values = self.simulate_indices(starting_portfolio, date_range, path=True)
+        return dict(zip(date_range, values.tolist()))
 
 
     def get_comparison(self, start_date, end_date):
         #get starting information
-        return_dict = self.get_return_data()
-        
         date_range = self.date_range(start_date, end_date)
         starting_portfolio = self.starting_port
 
@@ -164,68 +67,119 @@ def period_value_comparison(start_val, period, data):
     start_val = starting portfolio value (int)
     period = tuple of form (start date (str, m/d/yyyy), end date(str))
     data = ReturnData object
+    returns [display period, final value of each index in data.get_columns() order]
     '''
     start_date = period[0]
     end_date = period[1]
     display_period = start_date + " - " + end_date
 
-    first_month = data.end_of_month(period[0], data.get_ordered_dates())
-
-    #get all data
-    portfolio = Portfolio(start_val, data.filename)
-    all_values = portfolio.get_comparison(first_month, end_date)
+    #the month's row on monthly files, the first row on or after the start date on daily and weekly ones
+    first_month = data.period_start(period[0])
 
-    #name data
-    lcg = all_values[end_date][0]
-    lcv = all_values[end_date][1]
-    mcg = all_values[end_date][2]
-    mcv = all_values[end_date][3]
-    scg = all_values[end_date][4]
-    scv = all_values[end_date][5]
+    #final values only, reusing the already parsed return matrix
+    portfolio = Portfolio(start_val, data.filename, data.get_return_store())
+    values = portfolio.simulate_indices(portfolio.starting_port, portfolio.date_range(first_month, end_date))
 
-    return [display_period, lcg, lcv, mcg, mcv, scg, scv]
+    return [display_period] + values
 
-def rolling_pd_comparison(start_value, filename):
+@instrument.timed("rolling_pd_comparison")
+def rolling_pd_comparison(start_value, filename, lengths=(5, 10, 20), workers=None, chunk_size=None,
+        state_path=None, step=None):
+    '''
+    start_value = starting value of each index (int)
+    lengths = rolling period lengths in years (tuple of int)
+    workers, chunk_size = processes and periods per task for a parallel run (None runs serially)
+    state_path = file keeping results between runs; when set, only periods ending in rows appended
+        since the last run are computed
+    step = how often a period starts ("daily", "weekly", "monthly"; None for every row of the file)
+    returns one table per length, form [["date", first index name, ...], [display period, first index value, ...], ...]
+    '''
     data = ReturnData(filename)
 
-    #build dataframe, form {"time pd": [final values], ... }
-    five_yr = [["date", "lcg", "lcv", "mcg", "mcv", "scg", "scv"]]
-    rolling_periods = data.get_rolling_periods(5)
-    for period in rolling_periods:
-        period_comparison = period_value_comparison(10, period, data)
-        five_yr.append(period_comparison)
+    #ending value of every window for every length, computed in one pass from log return prefix sums
+    values, starts, window_rows = rolling_values(data, lengths, start_value, workers, chunk_size, state_path,
+        step)
 
-    ten_yr = [["date", "lcg", "lcv", "mcg", "mcv", "scg", "scv"]]
-    rolling_periods = data.get_rolling_periods(10)
-    for period in rolling_periods:
-        period_comparison = period_value_comparison(10, period, data)
-        ten_yr.append(period_comparison)
+    tables = []
+    first = 0
+    for length in lengths:
+        #windows for this length, same order as get_rolling_periods
+        periods = data.get_rolling_periods(length, step)
+        length_values = values[first:first + len(periods)].tolist()
+        first += len(periods)
+        table = [["date"] + list(data.get_columns())]
+        for period, period_values in zip(periods, length_values):
+            table.append([period[0] + " - " + period[1]] + period_values)
+        tables.append(table)
 
-    twenty_yr = [["date", "lcg", "lcv", "mcg", "mcv", "scg", "scv"]]
-    rolling_periods = data.get_rolling_periods(20)
-    for period in rolling_periods:
-        period_comparison = period_value_comparison(10, period, data)
-        twenty_yr.append(period_comparison)
+    return tables
 
-    return five_yr, ten_yr, twenty_yr
-
-
-if __name__ == "__main__":
-    #data = ReturnData("/home/michaela/summerwork/growth_value_project/growth_value.csv")
-    #print(period_value_comparison(10, ("1/1/2000", "12/31/2004"), data))
-    five_yr, ten_yr, twenty_yr = rolling_pd_comparison(10,"/home/michaela/summerwork/growth_value_project/growth_value_return_data.csv")
-    
 
-    with open("five_yr_data.csv", "w", newline = "") as fyd:
-        writer = csv.writer(fyd)
-        writer.writerows(five_yr)
+def iter_rolling_pd_comparison(start_value, filename, lengths=(5, 10, 20), chunk_size=4096, step=None,
+        workers=None):
+    '''
+    generator version of rolling_pd_comparison, holding one chunk of periods at a time
+    workers = processes; with more than 1 a few chunks at a time are computed on a pool and yielded in order
+    yields (length, display periods, values) chunks, values is a (periods x indices) array in
+        ReturnData(filename).get_columns() order
+    '''
+    return iter_rolling_values(ReturnData(filename), lengths, start_value, chunk_size, step, workers)
 
-    with open("ten_yr_data.csv", "w", newline = "") as tyd:
-        writer = csv.writer(tyd)
-        writer.writerows(ten_yr)
+def rolling_pd_summary(start_value, filename, lengths=(5, 10, 20), chunk_size=4096, step=None, workers=None):
+    '''
+    returns {length: RollingSummary over the indices} of every rolling period's values, in percent of the starting
+    value as in the growth-value notebook, computed as the periods are simulated without keeping the tables
+    '''
+    columns = ReturnData(filename).get_columns()
+    summaries = {length: RollingSummary(columns, 100 / start_value) for length in lengths}
+    for length, labels, values in iter_rolling_pd_comparison(start_value, filename, lengths, chunk_size, step,
+            workers):
+        summaries[length].update(values)
+    return summaries
+
+def write_rolling_pd_comparison(start_value, filename, outputs, chunk_size=4096, step=None, workers=None):
+    '''
+    outputs = {rolling period length in years: output path (.csv, .parquet/.arrow/.feather, or .npy)}
+    streams each length's table to its file as it is computed
+    returns {length: RollingSummary} of the written values (see rolling_pd_summary), built in the same pass
+    '''
+    columns = ReturnData(filename).get_columns()
+    summaries = {length: RollingSummary(columns, 100 / start_value) for length in outputs}
+    sinks = {}
+    try:
+        for length, path in outputs.items():
+            sinks[length] = open_sink(path, columns)
+        for length, labels, values in iter_rolling_pd_comparison(start_value, filename, list(outputs), chunk_size,
+                step, workers):
+            sinks[length].write(labels, values)
+            summaries[length].update(values)
+    finally:
+        for sink in sinks.values():
+            sink.close()
+    return summaries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="compare the growth and value indices over rolling periods, or "
+        "over one period with --period")
+    cli.add_common_arguments(parser, [5, 10, 20])
+    args = parser.parse_args(argv)
+
+    if args.period:
+        data = ReturnData(args.filename)
+        display_period, *values = period_value_comparison(args.start_value, args.period, data)
+        print(json.dumps({display_period: dict(zip(data.get_columns(), values))}, indent=1))
+        return
+
+    outputs = cli.output_paths(parser, args)
+    if outputs:
+        summaries = write_rolling_pd_comparison(args.start_value, args.filename, outputs, args.chunk_size,
+            args.step, cli.workers(args))
+    else:
+        summaries = rolling_pd_summary(args.start_value, args.filename, args.length, args.chunk_size, args.step,
+            cli.workers(args))
+    cli.report(args, summaries, "Percent growth of indices over rolling periods")
 
-    with open("twenty_yr_data.csv", "w", newline="") as twyd:
-        writer = csv.writer(twyd)
-        writer.writerows(twenty_yr)
 
-    
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,279 +1,283 @@
-import csv
-import matplotlib.pyplot as plt
-from datetime import datetime
-
-def print_duration(fn):
-    def fn_with_duration(*args, **kwargs):
-        start = datetime.now()
-        ret = fn(*args, **kwargs)
-        print("FN {} took: {}".format(fn.__name__, datetime.now()-start))
-        return ret
-    return fn_with_duration
-
-
-class ReturnData(object):
-    def __init__(self, filename):
-        self.filename = filename
-        self.ordered_dates = None
-        self.rolling_periods = None
-
-    #TODO: make this only run once, and reference the dictionary, not the function
-    # @print_duration
-    def get_return_data(self):
-        '''
-        reads data from csv file containing historical data for total returns, value, and asset
-        allocations for unbalanced, monthly rebalanced, and annually rebalanced portfolio.
-        '''
-        #initialize dict for date and list of monthly returns, ordered list of dates
-        # dict form {date: [large cap, small cap, international equity, bonds, cash]}
-        return_dict = {}
-        #read csv
-        with open(self.filename) as rebal:
-            for row in csv.reader(rebal):
-                if row[1].isalpha() or row[1] == '':
-                    continue
-                else:
-                    date = row[1]
-                    lc_ret = row[2]
-                    sc_ret = row[3]
-                    int_ret = row[4]
-                    bond_ret = row[5]
-                    cash_ret = row[6]
-
-                #add data to dict, list
-                return_dict[date] = [lc_ret, sc_ret, int_ret, bond_ret, cash_ret]
-
-        return return_dict
-
-    def get_ordered_dates(self):
-        if self.ordered_dates is not None:
-            return self.ordered_dates
-        else:
-            ordered_dates = []
-            #read csv
-            with open("/home/michaela/summerwork/rebalancing_project/rebalance.csv") as rebal:
-                for row in csv.reader(rebal):
-                    if not(row[1].isalpha()) and not(row[1] == ''):
-                        date = row[1]
-                        ordered_dates.append(date)
-            self.ordered_dates = ordered_dates
-            return self.ordered_dates
-
-    def beginning_of_month(self, your_date):
-        if your_date[1] == "/":
-            return your_date[:1] + "/1/" + your_date[-4:]
-        if your_date[2] == "/":
-            return your_date[:2] + "/1/" + your_date[-4:]
-
-    def end_of_month(self, your_date, ordered_dates):
-        '''
-        input m/yyyy (str), last business day of months (lst)
-        return last business day of given month
-        '''
-        for date in ordered_dates:
-            if date[-4:] == your_date[-4:] and date[:2] == your_date[:2]:
-                return date
-
-    def get_rolling_periods(self, length = 25):
-        '''
-        input: length of each rolling period (int)
-        returns rolling periods in list of tuples
-        '''
-        if self.rolling_periods is not None:
-            return self.rolling_periods
-        else:
-            ordered_dates = self.get_ordered_dates()
-            rolling_periods = []
-            total_month_count = len(ordered_dates)
-            for i in range (0, total_month_count-(((length-1)*12)+11)):
-                start = self.beginning_of_month(ordered_dates[i])
-                end = ordered_dates[i+((length-1)*12)+11]
-                rolling_periods.append((start,end))
-            self.rolling_periods = rolling_periods
-            return self.rolling_periods
-
-
-class Portfolio(ReturnData):
+import argparse
+import json
+
+import numpy as np
+
+import returns_engine
+from returns_engine import (RollingSummary, cli, instrument, iter_rolling_rebalanced, open_sink, rolling_rebalanced,
+    schedule_months)
+
+#share of the equity allocation in large cap, small cap, international equity
+EQUITY_SPLIT = (.55, .15, .3)
+
+#form (name, proportion of equities, bonds, cash)
+RISK_LEVELS = [
+    ("low risk", 0.3, 0.65, 0.05),
+    ("med risk", 0.5, 0.45, 0.05),
+    ("high risk", 0.7, 0.25, 0.05),
+]
+
+#schedules compared by rolling_pd_comparison, form (name used in output, schedule)
+REBALANCE_SCHEDULES = [
+    ("unbalanced", "none"),
+    ("monthly", "monthly"),
+    ("annual", "annual"),
+]
+
+class ReturnData(returns_engine.ReturnData):
+    #return columns following the date: large cap, small cap, international equity, bonds, cash
+    #(the export has value and allocation columns after them, so only the first 5 are read)
+    asset_columns = 5
+
+
+class Portfolio(returns_engine.Portfolio, ReturnData):
     '''
     attributes: starting_value, proportion of equities, bonds, cash
     '''
 
-    def __init__(self, start_value, prop_equities, prop_bonds, prop_cash, filename):
-        self.starting_value = start_value
+    def __init__(self, start_value, prop_equities, prop_bonds, prop_cash, filename, return_store=None):
         self.equities = prop_equities
-        self.large_cap = self.equities * .55
-        self.small_cap = self.equities * .15
-        self.int = self.equities * .3
+        self.large_cap = self.equities * EQUITY_SPLIT[0]
+        self.small_cap = self.equities * EQUITY_SPLIT[1]
+        self.int = self.equities * EQUITY_SPLIT[2]
         self.bonds = prop_bonds
         self.cash = prop_cash
-        ReturnData.__init__(self, filename)
-
-    def starting_portfolio(self):
-        '''
-        return initial portfolio allocation
-        '''
-        return [self.starting_value, self.starting_value * self.large_cap, self.starting_value * self.small_cap, 
-            self.starting_value * self.int, self.starting_value * self.bonds, self.starting_value * self.cash]
-    
-    def date_range(self, start_of_period, end_of_period):
-        '''
-        inputs: start_of_period (str, m/d/yyyy), end_of_period
-        returns ordered list of all dates in date range
-        '''
-        ordered_dates = self.get_ordered_dates()
-
-        end_date_range = ordered_dates[ordered_dates.index(start_of_period): ordered_dates.index(end_of_period)]
-        end_date_range.append(end_of_period)
-        date_range = [self.beginning_of_month(start_of_period)]
-        date_range.extend(end_date_range)
-
-        return date_range
-
-    def get_months_returns(self, date, date_range, portfolio):
-        '''
-        gets the new portfolio value for a single month, month date_range[date]
-        '''
-        return_dict = self.get_return_data()
-        lc = ((float(return_dict[date_range[date]][0])/100)+1) * portfolio[date_range[date-1]][1]
-        sc = ((float(return_dict[date_range[date]][1])/100) +1) * portfolio[date_range[date-1]][2]
-        inter = ((float(return_dict[date_range[date]][2])/100)+1) * portfolio[date_range[date-1]][3]
-        bond_val = ((float(return_dict[date_range[date]][3])/100)+1) * portfolio[date_range[date-1]][4]
-        cash_val = ((float(return_dict[date_range[date]][4])/100)+1) * portfolio[date_range[date-1]][5]
-        total_val = lc + sc + inter + bond_val + cash_val
-
-        return [total_val, lc, sc, inter, bond_val, cash_val]
-
-
-    def untouched_returns(self, starting_portfolio, date_range):
-        '''
-        inputs: starting_portfolio (lst, form [starting val, lc val, sc val, int val, bond val, cash val]),
-            return_dict (dict, form {date:[<same form as starting_portfolio>]}
-            date_range (ordered lst of dates in focus range)
-        returns dict of monthly return data for unbalanced portfolio
-        '''
-        #initialize dict of monthly values of untouched portfolio, filled with starting port value
-        # form {date: [total value, lc, sc, int., bond, cash, EP, BP, CP]}
-        untouched_port = {date_range[0]: starting_portfolio}
-
-        #populate untouched_port dict, starting range at 1 bc we have the starting port for values resulting from date_range[0]
-        for date in range(1, len(date_range)):
-            new_entry = self.get_months_returns(date, date_range, untouched_port)
-            untouched_port[date_range[date]] = new_entry
-
-        #return final dict with all port values for all months in pd
-        return untouched_port
-
-    def rebalance(self, current_port_values):
-        '''
-        input current portfolio values, form [total_val, lc, sc, int, bond, cash]
-        output same total value rebalanced according to initial allocations
-        '''
-        total_val = current_port_values[0]
-        lc = total_val * self.large_cap
-        sc = total_val * self.small_cap
-        inter = total_val * self.int
-        bonds = total_val * self.bonds
-        cash = total_val * self.cash
-
-        return [total_val, lc, sc, inter, bonds, cash]
-
-    def monthly_rebalanced(self, starting_portfolio, date_range):
-        '''
-        same as untouched but with monthly rebalancing
-        '''
-        #initialize dict of monthly values of monthly rebalanced portfolio, filled with starting port value
-        # form {date: [total value, lc, sc, int., bond, cash, EP, BP, CP]}
-        monthly_rebal_port = {date_range[0]: starting_portfolio}
-
-        #populate monthly_rebal_port dict, starting range at 1 bc we have the starting port for values resulting from date_range[0]
-        for date in range(1, len(date_range)):
-            new_entry = self.get_months_returns(date, date_range, monthly_rebal_port)
-            monthly_rebal_port[date_range[date]] = self.rebalance(new_entry)
-
-        #return final dict with all port values for all months in pd
-        return monthly_rebal_port
-
-    def annually_rebalanced(self, starting_portfolio, date_range):
-        '''
-        same as untouched but with annual rebalancing
-        '''
-        #initialize dict of monthly values of annually rebalanced portfolio, filled with starting port value
-        # form {date: [total value, lc, sc, int., bond, cash, EP, BP, CP]}
-        annual_rebal_port = {date_range[0]: starting_portfolio}
-
-        #populate monthly_rebal_port dict, starting range at 1 bc we have the starting port for values resulting from date_range[0]
-        for date in range(1, len(date_range)):
-            new_entry = self.get_months_returns(date, date_range, annual_rebal_port)
-            if (date - 1) % 12 == 11:
-                annual_rebal_port[date_range[date]] = self.rebalance(new_entry)
-            else: 
-                annual_rebal_port[date_range[date]] = new_entry
-        
-
-        #return final dict with all port values for all months in pd
-        return annual_rebal_port
-
-
-    def get_rebal_comparison(self, start_date, end_date):
-        #get starting information
-        return_dict = self.get_return_data()
-        
-        date_range = self.date_range(start_date, end_date)
-        starting_portfolio = self.starting_portfolio()
-
-        #get historical values of all three portfolios 
-        untouched_port = self.untouched_returns(starting_portfolio, date_range)
-        monthly_rebal_port = self.monthly_rebalanced(starting_portfolio, date_range)
-        annual_rebal_port = self.annually_rebalanced(starting_portfolio, date_range)
-
-
-        return untouched_port[end_date][0], monthly_rebal_port[end_date][0], annual_rebal_port[end_date][0]
+        returns_engine.Portfolio.__init__(self, start_value,
+            [self.large_cap, self.small_cap, self.int, self.bonds, self.cash], filename, return_store)
 
 #########
 
 
-def period_value_comparison(start_val, period, data):
+def period_value_comparison(start_val, period, data, risk_levels=RISK_LEVELS, schedules=REBALANCE_SCHEDULES):
     '''
     start_val = starting portfolio value (int)
     period = tuple of form (start date (str, m/d/yyyy), end date(str))
     data = ReturnData object
+    risk_levels = portfolios compared, form [(name, proportion of equities, bonds, cash), ...]
+    schedules = rebalancing compared, form [(name, schedule), ...] as REBALANCE_SCHEDULES
     '''
     start_date = period[0]
     end_date = period[1]
     display_period = start_date + " - " + end_date
 
-    first_month = data.end_of_month(period[0], data.get_ordered_dates())
+    #the month's row on monthly files, the first row on or after the start date on daily and weekly ones
+    first_month = data.period_start(period[0])
+    #every portfolio reads from the already parsed data, no file access per period
+    store = data.get_return_store()
 
-    #low risk port
-    low_risk_portfolio = Portfolio(start_val, 0.3, 0.65, 0.05, data.filename)
-    low_untouched, low_monthly, low_annual = low_risk_portfolio.get_rebal_comparison(first_month, end_date)
+    rebalance_every = [schedule_months(schedule) for name, schedule in schedules]
+    values = []
+    for name, equities, bonds, cash in risk_levels:
+        portfolio = Portfolio(start_val, equities, bonds, cash, data.filename, store)
+        values.append(portfolio.get_rebal_comparison(first_month, end_date, rebalance_every))
 
-    #med risk port
-    med_risk_portfolio = Portfolio(start_val, 0.5, 0.45, 0.05, data.filename)
-    med_untouched, med_monthly, med_annual = med_risk_portfolio.get_rebal_comparison(first_month, end_date)
+    #order all unbalanced, then all monthly, then all annual (by default)
+    return display_period, [level_values[schedule] for schedule in range(len(schedules)) for level_values in values]
 
-    #high risk port
-    high_risk_portfolio = Portfolio(start_val, 0.7, 0.25, 0.05, data.filename)
-    high_untouched, high_monthly, high_annual = high_risk_portfolio.get_rebal_comparison(first_month, end_date)
+def allocation_weights(allocations, equity_split=EQUITY_SPLIT):
+    '''
+    input: allocations (lst of (proportion of equities, bonds, cash)), equity_split (large cap, small cap,
+        international share of equities)
+    returns weight matrix (allocations x 5 assets) in return column order
+    '''
+    allocations = np.atleast_2d(np.asarray(allocations, dtype=np.float64))
+    equities = allocations[:, :1]
+    return np.hstack([equities * np.asarray(equity_split, dtype=np.float64), allocations[:, 1:3]])
 
-    return display_period, [low_untouched, med_untouched, high_untouched, low_monthly, med_monthly, high_monthly,
-        low_annual, med_annual, high_annual,
-        ]
+def rolling_rebalance_cube(start_value, data, weights, schedules, length=25, workers=None, chunk_size=None,
+        state_path=None, step=None):
+    '''
+    start_value = starting portfolio value (int)
+    data = ReturnData object
+    weights = allocations x 5 assets weight matrix (see allocation_weights)
+    schedules = lst of rebalance schedules ("none", "monthly", "quarterly", "annual", or every k months as int)
+    length = rolling period length in years
+    workers, chunk_size = processes and periods per task for a parallel run (None runs serially)
+    state_path = file keeping results between runs; when set, only periods ending in rows appended
+        since the last run are simulated
+    step = how often a period starts ("daily", "weekly", "monthly"; None for every row of the file)
+    returns (rolling periods, cube), cube of ending values shaped (periods x allocations x schedules)
+    '''
+    cube = rolling_rebalanced(data, weights, schedules, length, start_value, workers, chunk_size, state_path, step)
+    return data.get_rolling_periods(length, step), cube
 
-def rolling_pd_comparison(start_value, filename):
+@instrument.timed("rolling_pd_comparison")
+def rolling_pd_comparison(start_value, filename, length=25, workers=None, chunk_size=None, state_path=None,
+        step=None, risk_levels=RISK_LEVELS, schedules=REBALANCE_SCHEDULES):
     data = ReturnData(filename)
-    rolling_periods = data.get_rolling_periods()
+    weights = allocation_weights([level[1:] for level in risk_levels])
+    schedules = [schedule for name, schedule in schedules]
+    rolling_periods, cube = rolling_rebalance_cube(start_value, data, weights, schedules, length,
+        workers, chunk_size, state_path, step)
 
     #build dataframe, form {"time pd": [final values of portfolios], ... }
+    #values ordered low/med/high unbalanced, then monthly, then annual
+    d = {}
+    for period, period_values in zip(rolling_periods, cube):
+        d[period[0] + " - " + period[1]] = period_values.T.ravel().tolist()
+    return d
+
+
+def portfolio_names(risk_levels=RISK_LEVELS, schedules=REBALANCE_SCHEDULES):
+    '''
+    returns names of the values in each rolling_pd_comparison row, e.g. "low risk unbalanced"
+    '''
+    return [risk[0] + " " + name for name, schedule in schedules for risk in risk_levels]
+
+def iter_rolling_pd_comparison(start_value, filename, length=25, chunk_size=4096, step=None,
+        risk_levels=RISK_LEVELS, schedules=REBALANCE_SCHEDULES, workers=None):
+    '''
+    generator version of rolling_pd_comparison, holding one chunk of periods at a time
+    workers = processes; with more than 1 a few chunks at a time are computed on a pool and yielded in order
+    yields (display periods, values) chunks, values is a (periods x 9) array in portfolio_names() order
+    '''
+    data = ReturnData(filename)
+    weights = allocation_weights([level[1:] for level in risk_levels])
+    schedules = [schedule for name, schedule in schedules]
+    for labels, cube in iter_rolling_rebalanced(data, weights, schedules, length, start_value, chunk_size,
+            step, workers):
+        yield labels, cube.transpose(0, 2, 1).reshape(len(labels), -1)
+
+def rolling_pd_summary(start_value, filename, length=25, chunk_size=4096, step=None, risk_levels=RISK_LEVELS,
+        schedules=REBALANCE_SCHEDULES, workers=None):
+    '''
+    returns RollingSummary of every rolling period's values over portfolio_names(), in percent of the starting
+    value as in rebalance.ipynb (mean, std, quantiles, min, max, share of periods each portfolio was best),
+    computed as the periods are simulated without keeping the per-period table
+    '''
+    summary = RollingSummary(portfolio_names(risk_levels, schedules), 100 / start_value)
+    for labels, values in iter_rolling_pd_comparison(start_value, filename, length, chunk_size, step, risk_levels,
+            schedules, workers):
+        summary.update(values)
+    return summary
+
+def write_rolling_pd_comparison(start_value, filename, output, length=25, chunk_size=4096, step=None,
+        risk_levels=RISK_LEVELS, schedules=REBALANCE_SCHEDULES, workers=None):
+    '''
+    output = output path (.csv, .parquet/.arrow/.feather, or .npy), one row per rolling period
+    streams the comparison to output as it is computed
+    returns RollingSummary of the written values (see rolling_pd_summary), built in the same pass
+    '''
+    summary = RollingSummary(portfolio_names(risk_levels, schedules), 100 / start_value)
+    with open_sink(output, portfolio_names(risk_levels, schedules)) as sink:
+        for labels, values in iter_rolling_pd_comparison(start_value, filename, length, chunk_size, step,
+                risk_levels, schedules, workers):
+            sink.write(labels, values)
+            summary.update(values)
+    return summary
+
+@instrument.timed("rolling_threshold_comparison")
+def rolling_threshold_comparison(start_value, filename, length=25, thresholds=(0.05, 0.1), cost=0.0, workers=None,
+        chunk_size=None, step=None, risk_levels=RISK_LEVELS):
+    '''
+    thresholds = drift bands compared, a portfolio is rebalanced once any asset's share is more than this far
+        from its weight (0.05 = 5 percentage points)
+    cost = transaction cost per unit traded (0.001 = 10 basis points)
+    other arguments as for rolling_pd_comparison
+    returns dict of form {"time pd": [(final value, rebalances, turnover) of each portfolio], ... }, portfolios
+        ordered as threshold_names()
+    '''
+    data = ReturnData(filename)
+    weights = allocation_weights([level[1:] for level in risk_levels])
+    values, rebalances, turnover = returns_engine.rolling_threshold(data, weights, thresholds, length, start_value,
+        workers, chunk_size, step, cost)
+
     d = {}
-    for period in rolling_periods:
-        period, comparison = period_value_comparison(10, period, data)
-        d[period] = comparison
+    for period, period_values, period_rebalances, period_turnover in zip(data.get_rolling_periods(length, step),
+            values, rebalances, turnover):
+        d[period[0] + " - " + period[1]] = list(zip(period_values.T.ravel().tolist(),
+            period_rebalances.T.ravel().tolist(), period_turnover.T.ravel().tolist()))
     return d
 
+def threshold_names(thresholds=(0.05, 0.1), risk_levels=RISK_LEVELS):
+    '''
+    returns names of the portfolios in each rolling_threshold_comparison row, e.g. "low risk 5% band"
+    '''
+    return [risk[0] + " {:g}% band".format(threshold * 100) for threshold in thresholds for risk in risk_levels]
+
+@instrument.timed("scenario_comparison")
+def scenario_comparison(start_value, filename, length=25, paths=10000, method="bootstrap", block=12, seed=0,
+        workers=None, memory_budget=returns_engine.scenarios.DEFAULT_MEMORY_BUDGET, risk_levels=RISK_LEVELS):
+    '''
+    length = years per synthetic path
+    paths = number of paths, each run through every portfolio in portfolio_names()
+    method, block = "bootstrap" (blocks of block consecutive historical months) or "parametric" (normal log
+        returns fitted to the history)
+    seed = random seed, the same seed gives the same outcomes for any number of workers
+    workers, memory_budget = processes, and bytes of paths each one simulates at a time
+    returns RollingSummary of the ending values over the paths, in percent of the starting value
+    '''
+    data = ReturnData(filename)
+    store = data.get_return_store()
+    weights = allocation_weights([level[1:] for level in risk_levels])
+    schedules = [schedule for name, schedule in REBALANCE_SCHEDULES]
+    growth = returns_engine.monthly_growth(store.growth, store.calendar.month_ordinals)
+    cube = returns_engine.simulate_scenarios(growth, weights, schedules, length * 12, paths, method, block, seed,
+        start_value, workers, memory_budget)
+
+    summary = RollingSummary(portfolio_names(risk_levels), 100 / start_value)
+    summary.update(cube.transpose(0, 2, 1).reshape(len(cube), -1))
+    return summary
+
+
+def parse_allocation(text):
+    '''
+    input "name=equities,bonds,cash" (proportions), returns a RISK_LEVELS entry (name, equities, bonds, cash)
+    '''
+    name, separator, proportions = text.rpartition("=")
+    try:
+        proportions = [float(proportion) for proportion in proportions.split(",")]
+    except ValueError:
+        proportions = []
+    if not separator or not name or len(proportions) != 3:
+        raise argparse.ArgumentTypeError("expected name=equities,bonds,cash, got {!r}".format(text))
+    return (name,) + tuple(proportions)
+
+def parse_schedule(text):
+    '''
+    input schedule name ("none", "monthly", "quarterly", "annual") or number of months
+    returns a REBALANCE_SCHEDULES entry (name used in output, schedule)
+    '''
+    schedule = int(text) if text.isdigit() else text
+    try:
+        months = schedule_months(schedule)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    if months == 0:
+        return ("unbalanced", schedule)
+    return (text if isinstance(schedule, str) else "every {} months".format(months), schedule)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="compare rebalanced portfolios over rolling periods, or over one "
+        "period with --period")
+    cli.add_common_arguments(parser, [25])
+    parser.add_argument("--allocation", action="append", type=parse_allocation, default=None,
+        help="portfolio as name=equities,bonds,cash, repeat for each one (default the low, med and high risk "
+        "levels)")
+    parser.add_argument("--schedule", nargs="+", type=parse_schedule, default=None,
+        help="rebalance schedules: none, monthly, quarterly, annual or a number of months "
+        "(default none monthly annual)")
+    args = parser.parse_args(argv)
+    risk_levels = args.allocation or RISK_LEVELS
+    schedules = args.schedule or REBALANCE_SCHEDULES
+
+    if args.period:
+        display_period, values = period_value_comparison(args.start_value, args.period, ReturnData(args.filename),
+            risk_levels, schedules)
+        print(json.dumps({display_period: dict(zip(portfolio_names(risk_levels, schedules), values))}, indent=1))
+        return
+
+    outputs = cli.output_paths(parser, args)
+    summaries = {}
+    for length in args.length:
+        if length in outputs:
+            summaries[length] = write_rolling_pd_comparison(args.start_value, args.filename, outputs[length],
+                length, args.chunk_size, args.step, risk_levels, schedules, cli.workers(args))
+        else:
+            summaries[length] = rolling_pd_summary(args.start_value, args.filename, length, args.chunk_size,
+                args.step, risk_levels, schedules, cli.workers(args))
+    cli.report(args, summaries, "Percent growth of portfolios based on risk and rebalancing")
+
 
 if __name__ == "__main__":
-    print("------------------")
-    data = ReturnData("/home/michaela/summerwork/rebalancing_project/rebalance.csv")
-    print(period_value_comparison(10, ("1/1/1979", "12/31/2004"), data))
-    
+    main()
@@ -0,0 +1,20 @@
+'''
+shared numeric engine behind rebalance.py and growth_value.py
+'''
+from returns_engine import instrument
+from returns_engine.cache import ReturnCache, default_cache, default_cache_dir
+from returns_engine.dates import FREQUENCIES, DateIndex, parse_date, month_ordinal, infer_frequency, add_years
+from returns_engine.store import ReturnStore, read_return_csv, load_return_store
+from returns_engine.rolling import log_growth_prefix, window_growth, rolling_windows, rolling_end_values
+from returns_engine.simulate import (SCHEDULES, schedule_months, portfolio_growth, simulate_rebalanced,
+    simulate_rebalanced_calendar, simulate_threshold)
+from returns_engine.parallel import (map_windows, iter_windows, iter_window_chunks, iter_pool_chunks, fixed_chunks,
+    end_values_chunk, rebalanced_chunk, calendar_rebalanced_chunk, threshold_chunk, default_workers)
+from returns_engine.incremental import incremental_windows, rows_digest
+from returns_engine.sinks import CsvSink, ArrowSink, NpySink, open_sink
+from returns_engine.portfolio import ReturnData, Portfolio
+from returns_engine.comparison import (period_labels, rolling_values, rolling_rebalanced, rolling_threshold,
+    iter_rolling_values, iter_rolling_rebalanced)
+from returns_engine.summary import QuantileDigest, RollingSummary
+from returns_engine.scenarios import SCENARIO_METHODS, complete_history, monthly_growth, bootstrap_growth, \
+    parametric_growth, paths_rebalanced, simulate_scenarios
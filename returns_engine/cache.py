@@ -0,0 +1,194 @@
+'''
+persistent on-disk cache of parsed return data
+
+each parsed file is stored as raw .npy arrays (returns, growth, dates) plus a small json entry recording
+the source path, size, mtime and sha256 of its contents. loading maps the arrays with np.load(mmap_mode="r")
+so a warm start never touches the csv parser and never copies the matrices. entries whose source changed
+are replaced, and the least recently used entries are evicted once the directory grows past max_bytes.
+
+the cache lives in $RETURNS_ENGINE_CACHE_DIR, else $XDG_CACHE_HOME/returns_engine or ~/.cache/returns_engine;
+setting RETURNS_ENGINE_CACHE_DIR to "off" disables it.
+'''
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+#bump when the layout of cache entries changes, older entries are then treated as stale
+CACHE_VERSION = 2
+
+ARRAYS = ("returns", "growth", "dates")
+
+
+def file_digest(filename, block_size=1 << 20):
+    '''
+    returns sha256 hex digest of a file's contents
+    '''
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def default_cache_dir():
+    '''
+    returns the cache directory from the environment, None when caching is turned off
+    '''
+    directory = os.environ.get("RETURNS_ENGINE_CACHE_DIR")
+    if directory is not None:
+        if directory.lower() in ("", "0", "off", "none"):
+            return None
+        return directory
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "returns_engine")
+
+
+class ReturnCache(object):
+    '''
+    attributes: directory (str), max_bytes (int, size the directory is trimmed back to after each write)
+    '''
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def entry_key(self, filename, asset_columns):
+        path = os.path.abspath(filename)
+        return hashlib.sha256("{}\0{!r}".format(path, asset_columns).encode()).hexdigest()[:32]
+
+    def _path(self, key, part):
+        if part == "meta":
+            return os.path.join(self.directory, key + ".json")
+        return os.path.join(self.directory, "{}.{}.npy".format(key, part))
+
+    def _read_meta(self, key):
+        try:
+            with open(self._path(key, "meta")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, key, meta):
+        partial = self._path(key, "meta") + ".partial"
+        with open(partial, "w") as f:
+            json.dump(meta, f)
+        os.replace(partial, self._path(key, "meta"))
+
+    def load(self, filename, asset_columns, stat=None):
+        '''
+        returns (dates, returns, growth, columns) for filename if a valid entry exists, else None
+        returns and growth are read-only memory maps of the cache files
+        '''
+        if stat is None:
+            stat = os.stat(filename)
+        key = self.entry_key(filename, asset_columns)
+        meta = self._read_meta(key)
+        if meta is None or meta.get("version") != CACHE_VERSION:
+            return None
+
+        if meta["size"] != stat.st_size:
+            return None
+        if meta["mtime_ns"] != stat.st_mtime_ns:
+            #touched or copied over: still valid if the contents are the same
+            if meta["sha256"] != file_digest(filename):
+                return None
+            meta["mtime_ns"] = stat.st_mtime_ns
+            self._write_meta(key, meta)
+
+        try:
+            arrays = {part: np.load(self._path(key, part), mmap_mode="r") for part in ARRAYS}
+        except (OSError, ValueError):
+            return None
+
+        #mark as recently used for eviction
+        os.utime(self._path(key, "meta"))
+        return arrays["dates"].tolist(), arrays["returns"], arrays["growth"], meta["columns"]
+
+    def save(self, store, asset_columns, stat=None):
+        '''
+        writes a ReturnStore's arrays to the cache, then evicts old entries past max_bytes
+        '''
+        if stat is None:
+            stat = os.stat(store.filename)
+        os.makedirs(self.directory, exist_ok=True)
+        key = self.entry_key(store.filename, asset_columns)
+
+        arrays = {"returns": store.returns, "growth": store.growth, "dates": np.array(store.dates, dtype=str)}
+        for part in ARRAYS:
+            partial = self._path(key, part) + ".partial"
+            with open(partial, "wb") as f:
+                np.save(f, np.ascontiguousarray(arrays[part]))
+            os.replace(partial, self._path(key, part))
+
+        #json entry is written last, so an entry only counts once all of its arrays are in place
+        self._write_meta(key, {
+            "version": CACHE_VERSION,
+            "path": os.path.abspath(store.filename),
+            "asset_columns": asset_columns if asset_columns is None or isinstance(asset_columns, int)
+                else list(asset_columns),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_digest(store.filename),
+            "columns": store.columns,
+        })
+        self.evict(keep=key)
+
+    def entries(self):
+        '''
+        returns lst of (last used time, total bytes, key) for every entry in the cache directory
+        '''
+        sizes = {}
+        used = {}
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        for name in names:
+            key = name.split(".", 1)[0]
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            sizes[key] = sizes.get(key, 0) + stat.st_size
+            if name == key + ".json":
+                used[key] = stat.st_mtime
+        #arrays without a json entry are leftovers of an interrupted write, evict them first
+        return [(used.get(key, 0), size, key) for key, size in sizes.items()]
+
+    def evict(self, keep=None):
+        '''
+        removes least recently used entries until the directory is within max_bytes
+        '''
+        entries = sorted(self.entries())
+        total = sum(size for used, size, key in entries)
+        for used, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self.remove(key)
+            total -= size
+
+    def remove(self, key):
+        for name in os.listdir(self.directory):
+            if name.split(".", 1)[0] == key:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+
+def default_cache():
+    '''
+    returns ReturnCache for the directory configured in the environment, None when turned off
+    '''
+    directory = default_cache_dir()
+    if directory is None:
+        return None
+    max_bytes = int(os.environ.get("RETURNS_ENGINE_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+    return ReturnCache(directory, max_bytes)
@@ -0,0 +1,109 @@
+'''
+command line handling shared by rebalance.py and growth_value.py: common arguments, output paths, and
+printing or plotting RollingSummary results
+
+matplotlib is only imported by plot_summaries and pyarrow only by the Arrow sinks, so a run writing csv or
+npy output loads numpy and the standard library, nothing else.
+'''
+import json
+import os
+
+from returns_engine.dates import FREQUENCIES
+from returns_engine.parallel import default_workers
+
+
+OUTPUT_FORMATS = ("csv", "parquet", "arrow", "feather", "npy")
+
+
+def add_common_arguments(parser, default_lengths):
+    '''
+    input: parser (argparse.ArgumentParser), default_lengths (lst of int, rolling period lengths in years)
+    adds the arguments both scripts take, returns the parser
+    '''
+    parser.add_argument("filename", help="return csv")
+    parser.add_argument("--length", type=int, nargs="+", default=list(default_lengths),
+        help="rolling period lengths in years (default {})".format(" ".join(map(str, default_lengths))))
+    parser.add_argument("--start-value", type=float, default=10, help="starting value of each portfolio")
+    parser.add_argument("--step", choices=FREQUENCIES, default=None,
+        help="how often a rolling period starts (default every row of the file)")
+    parser.add_argument("--period", nargs=2, metavar=("START", "END"),
+        help="compare the single period START - END (m/d/yyyy) instead of rolling periods")
+    parser.add_argument("--output", default=None,
+        help="file for each length's rolling periods, {length} is replaced by the length in years; "
+        "the extension picks the format (.csv, .parquet, .arrow, .feather, .npy)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default=None, help="output format, replacing the "
+        "extension of --output")
+    parser.add_argument("--workers", type=int, default=None,
+        help="processes to compute with (default 1, 0 for every cpu)")
+    parser.add_argument("--chunk-size", type=int, default=4096, help="periods computed and written at a time")
+    parser.add_argument("--plot", default=None, help="save box plots of the summaries to this image")
+    parser.add_argument("--quiet", action="store_true", help="do not print the summaries")
+    return parser
+
+
+def workers(args):
+    '''
+    returns the process count asked for on the command line, 0 meaning every cpu
+    '''
+    return default_workers() if args.workers == 0 else args.workers
+
+
+def output_paths(parser, args):
+    '''
+    returns {length: output path} for the lengths asked for, empty without --output
+    '''
+    if args.output is None:
+        if args.format is not None:
+            parser.error("--format needs --output")
+        return {}
+    if len(args.length) > 1 and "{length}" not in args.output:
+        parser.error("--output needs {length} in it when more than one --length is given")
+    output = args.output
+    if args.format is not None:
+        output = os.path.splitext(output)[0] + "." + args.format
+    return {length: output.replace("{length}", str(length)) for length in args.length}
+
+
+def summaries_json(summaries):
+    '''
+    input summaries ({length: RollingSummary})
+    returns json of form {"length": {series name: {"mean": .., ...}}}, as RollingSummary.as_dict
+    '''
+    return json.dumps({str(length): summary.as_dict() for length, summary in summaries.items()}, indent=1)
+
+
+def plot_summaries(summaries, path, title):
+    '''
+    input: summaries ({length: RollingSummary}), path (image file, format from its extension), title (str)
+    saves one box plot per length from the summaries' quartiles, min and max (whiskers) and mean, as the
+    notebooks' box plots but without the per-period tables
+    '''
+    #only plotting needs matplotlib, and a non-interactive backend so no display is needed
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(1, len(summaries), figsize=(6 * len(summaries), 8), squeeze=False)
+    for ax, (length, summary) in zip(axes[0], summaries.items()):
+        q1, median, q3 = (summary.quantile(q) for q in (0.25, 0.5, 0.75))
+        stats = [{"label": name, "whislo": summary.minimum[series], "q1": q1[series], "med": median[series],
+            "q3": q3[series], "whishi": summary.maximum[series], "mean": summary.mean[series]}
+            for series, name in enumerate(summary.names)]
+        ax.bxp(stats, showmeans=True, showfliers=False)
+        ax.set_title("{} year rolling periods".format(length))
+        ax.set_ylabel("percent growth")
+        ax.tick_params(axis="x", labelrotation=90)
+    fig.suptitle(title)
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def report(args, summaries, title):
+    '''
+    plots the summaries if --plot was given, and prints them as json unless --quiet
+    '''
+    if args.plot is not None:
+        plot_summaries(summaries, args.plot, title)
+    if not args.quiet:
+        print(summaries_json(summaries))
@@ -0,0 +1,148 @@
+'''
+rolling-period comparisons over a ReturnData: the generic part of rolling_pd_comparison in both scripts
+
+monthly files with a window starting every month use fixed row counts (length * 12 rows per window).
+daily and weekly files, or other entry point steps, use calendar windows from DateIndex.calendar_windows,
+whose row counts follow the business days in each window.
+'''
+import numpy as np
+
+from returns_engine.incremental import incremental_windows
+from returns_engine.parallel import (calendar_rebalanced_chunk, end_values_chunk, iter_window_chunks, iter_windows,
+    map_windows, rebalanced_chunk, threshold_chunk)
+from returns_engine.rolling import rolling_windows
+
+
+def rolling_values(data, lengths, start_value, workers=None, chunk_size=None, state_path=None, step=None):
+    '''
+    data = ReturnData object
+    lengths = rolling period lengths in years (lst of int)
+    start_value = starting value of each asset
+    workers, chunk_size = processes and periods per task for a parallel run (None runs serially)
+    state_path = file keeping results between runs; when set, only periods ending in rows appended
+        since the last run are computed (monthly windows only)
+    step = how often a period starts ("daily", "weekly", "monthly"; None for every row of the file)
+    returns (values, starts, window_rows): ending value of every asset for every period of every length
+        (periods x assets array), first row and row count of each period, grouped by length in order given
+    '''
+    store = data.get_return_store()
+    if not store.calendar.fixed_windows(step):
+        if state_path is not None:
+            raise ValueError("incremental runs need monthly windows, got {} rows stepped {}".format(
+                store.calendar.frequency, step))
+        starts, window_rows = store.calendar.calendar_windows(lengths, step)
+        values = map_windows(end_values_chunk, store.growth, (starts, window_rows), (start_value,),
+            workers, chunk_size, store.log_prefix())
+        return values, starts, window_rows
+
+    window_lengths = [length * 12 for length in lengths]
+    if state_path is not None:
+        values, starts, window_rows, computed = incremental_windows(state_path, end_values_chunk, store,
+            window_lengths, (start_value,), workers, chunk_size)
+    else:
+        starts, window_rows = rolling_windows(len(store), window_lengths)
+        values = map_windows(end_values_chunk, store.growth, (starts, window_rows), (start_value,),
+            workers, chunk_size, store.log_prefix())
+    return values, starts, window_rows
+
+
+def rolling_rebalanced(data, weights, schedules, length, start_value, workers=None, chunk_size=None,
+        state_path=None, step=None):
+    '''
+    data = ReturnData object
+    weights = allocations x assets weight matrix
+    schedules = lst of rebalance schedules ("none", "monthly", "quarterly", "annual", or every k months as int)
+    length = rolling period length in years
+    start_value, workers, chunk_size, state_path, step = as for rolling_values
+    returns cube of ending values shaped (periods x allocations x schedules), periods in get_rolling_periods order
+    '''
+    store = data.get_return_store()
+    args = (np.asarray(weights, dtype=np.float64), list(schedules), start_value)
+    if not store.calendar.fixed_windows(step):
+        if state_path is not None:
+            raise ValueError("incremental runs need monthly windows, got {} rows stepped {}".format(
+                store.calendar.frequency, step))
+        starts, window_rows = store.calendar.calendar_windows([length], step)
+        return map_windows(calendar_rebalanced_chunk, store.growth, (starts, window_rows),
+            (store.calendar.month_ordinals,) + args, workers, chunk_size, store.log_prefix())
+
+    if state_path is not None:
+        cube, starts, window_rows, computed = incremental_windows(state_path, rebalanced_chunk, store,
+            [length * 12], args, workers, chunk_size)
+    else:
+        starts, window_rows = rolling_windows(len(store), [length * 12])
+        cube = map_windows(rebalanced_chunk, store.growth, (starts, window_rows), args, workers, chunk_size,
+            store.log_prefix())
+    return cube
+
+
+def rolling_threshold(data, weights, thresholds, length, start_value, workers=None, chunk_size=None, step=None,
+        cost=0.0):
+    '''
+    data, weights, length, start_value, workers, chunk_size, step = as for rolling_rebalanced
+    thresholds = lst of drift bands (rebalance once an asset's share is more than this far from its weight)
+    cost = transaction cost per unit traded
+    returns (values, rebalances, turnover), each shaped (periods x allocations x thresholds), periods in
+        get_rolling_periods order
+    '''
+    store = data.get_return_store()
+    if store.calendar.fixed_windows(step):
+        starts, window_rows = rolling_windows(len(store), [length * 12])
+    else:
+        starts, window_rows = store.calendar.calendar_windows([length], step)
+    args = (np.asarray(weights, dtype=np.float64), list(thresholds), start_value, cost)
+    results = map_windows(threshold_chunk, store.growth, (starts, window_rows), args, workers, chunk_size,
+        store.log_prefix())
+    return results[..., 0], results[..., 1].astype(np.int64), results[..., 2]
+
+
+def period_labels(data, length, step=None):
+    '''
+    returns display labels "start - end" of the rolling periods of length years, in get_rolling_periods order
+    '''
+    return [start + " - " + end for start, end in data.get_rolling_periods(length, step)]
+
+
+def iter_rolling_values(data, lengths, start_value, chunk_size=4096, step=None, workers=None):
+    '''
+    generator version of rolling_values, holding one chunk of periods at a time
+    yields (length in years, display periods, values) chunks, values is a (periods x assets) array
+    workers = processes; with more than 1 chunks are computed on a pool a few at a time and yielded in order,
+        so memory still follows chunk_size rather than the number of periods
+    '''
+    store = data.get_return_store()
+    calendar = store.calendar
+    if not calendar.fixed_windows(step):
+        for length in lengths:
+            for chunk, values in iter_window_chunks(end_values_chunk, store.growth,
+                    calendar.calendar_windows([length], step), (start_value,), chunk_size, store.log_prefix(),
+                    workers):
+                yield length, calendar.calendar_window_labels(*chunk), values
+        return
+
+    for window_rows, starts, values in iter_windows(end_values_chunk, store.growth,
+            [length * 12 for length in lengths], (start_value,), chunk_size, store.log_prefix(), workers):
+        labels = calendar.window_labels(int(starts[0]), int(starts[-1]) + 1, window_rows)
+        yield window_rows // 12, labels, values
+
+
+def iter_rolling_rebalanced(data, weights, schedules, length, start_value, chunk_size=4096, step=None,
+        workers=None):
+    '''
+    generator version of rolling_rebalanced, holding one chunk of periods at a time
+    yields (display periods, cube) chunks, cube shaped (periods x allocations x schedules)
+    workers as for iter_rolling_values
+    '''
+    store = data.get_return_store()
+    calendar = store.calendar
+    args = (np.asarray(weights, dtype=np.float64), list(schedules), start_value)
+    if not calendar.fixed_windows(step):
+        for chunk, cube in iter_window_chunks(calendar_rebalanced_chunk, store.growth,
+                calendar.calendar_windows([length], step), (calendar.month_ordinals,) + args, chunk_size,
+                store.log_prefix(), workers):
+            yield calendar.calendar_window_labels(*chunk), cube
+        return
+
+    for window_rows, starts, cube in iter_windows(rebalanced_chunk, store.growth, [length * 12], args,
+            chunk_size, store.log_prefix(), workers):
+        yield calendar.window_labels(int(starts[0]), int(starts[-1]) + 1, window_rows), cube
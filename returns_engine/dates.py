@@ -0,0 +1,235 @@
+'''
+date index for the return exports: dates are parsed once into integer fields and month ordinals
+so lookups by date or by month are dict/array operations instead of string scans
+'''
+import numpy as np
+
+from returns_engine import instrument
+
+
+def parse_date(your_date):
+    '''
+    input date (str, m/d/yyyy or m/yyyy)
+    returns (year, month, day) ints, day is 1 for m/yyyy
+    '''
+    parts = your_date.split("/")
+    if len(parts) == 2:
+        return int(parts[1]), int(parts[0]), 1
+    return int(parts[2]), int(parts[0]), int(parts[1])
+
+
+def month_ordinal(year, month):
+    '''
+    returns number of months since year 0 (int), consecutive months differ by 1
+    '''
+    return year * 12 + month - 1
+
+
+#entry point steps understood by DateIndex.entry_rows, and the frequencies infer_frequency reports
+FREQUENCIES = ("daily", "weekly", "monthly")
+
+
+def infer_frequency(datetimes):
+    '''
+    input datetimes (datetime64[D] array, ordered)
+    returns "daily", "weekly" or "monthly" from the typical gap between consecutive dates
+    '''
+    if len(datetimes) < 2:
+        return "monthly"
+    gap = np.median(np.diff(datetimes.astype(np.int64)))
+    if gap <= 4:
+        return "daily"
+    if gap <= 10:
+        return "weekly"
+    return "monthly"
+
+
+def add_years(datetimes, years):
+    '''
+    input: datetimes (datetime64[D] array), years (int)
+    returns the same days of the month years later (days past the end of a month roll into the next one)
+    '''
+    months = datetimes.astype("datetime64[M]")
+    return (months + 12 * years).astype("datetime64[D]") + (datetimes - months.astype("datetime64[D]"))
+
+
+def week_ordinals(datetimes):
+    '''
+    returns number of monday-starting weeks since the epoch for each date (int array)
+    '''
+    #1970-01-01 was a thursday
+    return (datetimes.astype(np.int64) + 3) // 7
+
+
+class DateIndex(object):
+    '''
+    ordered dates of a return file with precomputed lookups
+    attributes: dates (ordered lst of str), rows (dict, {date: row}), years, months, days (int arrays),
+        month_ordinals (int array), datetimes (datetime64[D] array), month_first_row and month_last_row
+        (dict, {month ordinal: row}), month_start_labels (lst of str, m/1/yyyy for each row),
+        frequency ("daily", "weekly" or "monthly", see infer_frequency),
+        anchors (datetime64[D] array, day each row's period starts: the first of the month for monthly
+        files, the date itself otherwise), start_labels (lst of str, anchors as m/d/yyyy)
+    '''
+
+    def __init__(self, dates):
+        with instrument.stage("date_index"):
+            self._build(dates)
+
+    def _build(self, dates):
+        self.dates = dates
+        self.rows = {date: row for row, date in enumerate(dates)}
+
+        fields = np.array([parse_date(date) for date in dates], dtype=np.int64).reshape(len(dates), 3)
+        self.years = fields[:, 0]
+        self.months = fields[:, 1]
+        self.days = fields[:, 2]
+        self.month_ordinals = self.years * 12 + self.months - 1
+        self.datetimes = (self.month_ordinals - 1970 * 12).astype("datetime64[M]").astype("datetime64[D]") + \
+            (self.days - 1).astype("timedelta64[D]")
+
+        self.month_first_row = {}
+        self.month_last_row = {}
+        for row, ordinal in enumerate(self.month_ordinals.tolist()):
+            self.month_first_row.setdefault(ordinal, row)
+            self.month_last_row[ordinal] = row
+
+        self.month_start_labels = ["{}/1/{}".format(month, year)
+            for year, month in zip(self.years.tolist(), self.months.tolist())]
+
+        self.frequency = infer_frequency(self.datetimes)
+        if self.frequency == "monthly":
+            self.anchors = self.datetimes.astype("datetime64[M]").astype("datetime64[D]")
+            self.start_labels = self.month_start_labels
+        else:
+            self.anchors = self.datetimes
+            self.start_labels = dates
+
+    def __len__(self):
+        return len(self.dates)
+
+    def row(self, date):
+        '''
+        input date (str, m/d/yyyy) present in the file, returns its row
+        '''
+        return self.rows[date]
+
+    def month_of(self, your_date):
+        '''
+        input date (str, m/d/yyyy or m/yyyy), returns its month ordinal
+        '''
+        row = self.rows.get(your_date)
+        if row is not None:
+            return int(self.month_ordinals[row])
+        year, month, day = parse_date(your_date)
+        return month_ordinal(year, month)
+
+    def beginning_of_month(self, your_date):
+        '''
+        input date (str, m/d/yyyy), returns first of that month (str, m/1/yyyy)
+        '''
+        row = self.rows.get(your_date)
+        if row is not None:
+            return self.month_start_labels[row]
+        year, month, day = parse_date(your_date)
+        return "{}/1/{}".format(month, year)
+
+    def end_of_month(self, your_date):
+        '''
+        input date (str, m/d/yyyy or m/yyyy), returns last date in the file in that month, None if
+        the file has no dates in that month
+        '''
+        row = self.month_last_row.get(self.month_of(your_date))
+        if row is None:
+            return None
+        return self.dates[row]
+
+    def period_start(self, your_date):
+        '''
+        input date (str, m/d/yyyy or m/yyyy), returns the date in the file a period starting then begins at:
+        the row of that month for monthly files (as end_of_month), the first date on or after it otherwise;
+        None if the file has no such date
+        '''
+        if self.frequency == "monthly":
+            return self.end_of_month(your_date)
+        row = self.rows.get(your_date)
+        if row is None:
+            year, month, day = parse_date(your_date)
+            target = np.datetime64("{:04d}-{:02d}-{:02d}".format(year, month, day), "D")
+            row = int(np.searchsorted(self.datetimes, target))
+            if row == len(self.dates):
+                return None
+        return self.dates[row]
+
+    def window_labels(self, first, stop, length):
+        '''
+        input: first, stop (int, range of window start rows), length (int, rows per window)
+        returns display labels "m/1/yyyy - m/d/yyyy" for the windows starting at rows first..stop-1
+        '''
+        with instrument.stage("window_construction"):
+            return [start + " - " + end for start, end in
+                zip(self.month_start_labels[first:stop], self.dates[first + length - 1:stop + length - 1])]
+
+    def fixed_windows(self, step=None):
+        '''
+        returns True when windows starting every step (see entry_rows) are a fixed number of rows, so
+        rolling.rolling_windows applies: monthly files with monthly steps
+        '''
+        return self.frequency == "monthly" and step in (None, "monthly")
+
+    def entry_rows(self, step=None):
+        '''
+        input step ("daily", "weekly" or "monthly"; None for the file's own frequency)
+        returns rows where windows may start (int array): every row, or the first row of each week or month
+        '''
+        step = step or self.frequency
+        if step not in FREQUENCIES:
+            raise ValueError("unknown step {!r}, expected one of {}".format(step, ", ".join(FREQUENCIES)))
+        if step == "daily" or len(self.dates) == 0:
+            return np.arange(len(self.dates), dtype=np.int64)
+        periods = week_ordinals(self.datetimes) if step == "weekly" else self.month_ordinals
+        return np.flatnonzero(np.diff(periods, prepend=periods[0] - 1)).astype(np.int64)
+
+    def covers(self, targets):
+        '''
+        input targets (datetime64[D] array, exclusive window end days)
+        returns bool array, True where the file has data up to the target: no period of the file's frequency
+        (business day, week or month) falls between the last date and the target
+        '''
+        if len(self.dates) == 0:
+            return np.zeros(len(targets), dtype=bool)
+        last = self.datetimes[-1]
+        if self.frequency == "daily":
+            return np.busday_count(last + 1, np.maximum(targets, last + 1)) == 0
+        if self.frequency == "weekly":
+            return week_ordinals(targets - 1) <= week_ordinals(last)
+        return (targets - 1).astype("datetime64[M]") <= last.astype("datetime64[M]")
+
+    def calendar_windows(self, years, step=None):
+        '''
+        input: years (iterable of int, window lengths in calendar years), step (entry point step, see entry_rows)
+        returns (starts, lengths) int arrays listing every full window, grouped by length in the order given
+            and ordered by start row within each length. a window starting at row i holds the rows dated
+            before anchors[i] + years, so lengths vary with the business days in each window.
+        for monthly files with a window starting every month this matches rolling.rolling_windows
+        '''
+        with instrument.stage("window_construction"):
+            entries = self.entry_rows(step)
+            starts = [np.empty(0, dtype=np.int64)]
+            lengths = [np.empty(0, dtype=np.int64)]
+            for length in years:
+                targets = add_years(self.anchors[entries], length)
+                ends = np.searchsorted(self.datetimes, targets, side="left")
+                full = self.covers(targets) & (ends > entries)
+                starts.append(entries[full])
+                lengths.append((ends - entries)[full].astype(np.int64))
+            return np.concatenate(starts), np.concatenate(lengths)
+
+    def calendar_window_labels(self, starts, lengths):
+        '''
+        input: starts, lengths (int arrays, as from calendar_windows)
+        returns display labels "start - m/d/yyyy" for the windows, start as in start_labels
+        '''
+        with instrument.stage("window_construction"):
+            return [self.start_labels[start] + " - " + self.dates[end] for start, end in
+                zip(starts.tolist(), (starts + lengths - 1).tolist())]
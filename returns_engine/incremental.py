@@ -0,0 +1,93 @@
+'''
+append-only incremental updates of rolling-window results
+
+results of the previous run are saved next to a fingerprint of the rows they were computed from.
+when the return file has only gained rows at the end, only windows ending in the new rows are computed;
+any change to earlier rows (or to the run's parameters) forces a full recompute.
+'''
+import hashlib
+import os
+import pickle
+
+import numpy as np
+
+from returns_engine import instrument
+from returns_engine.parallel import map_windows
+from returns_engine.rolling import rolling_windows
+
+
+def rows_digest(store, row_count):
+    '''
+    returns sha256 hex digest of the first row_count dates and returns of a ReturnStore
+    '''
+    digest = hashlib.sha256()
+    digest.update("\n".join(store.dates[:row_count]).encode())
+    digest.update(np.ascontiguousarray(store.returns[:row_count]).tobytes())
+    return digest.hexdigest()
+
+
+def run_key(fn, window_lengths, args):
+    '''
+    returns digest identifying the computation, so saved results are only reused for the same run
+    '''
+    return hashlib.sha256(pickle.dumps((fn.__module__, fn.__qualname__, list(window_lengths), args))).hexdigest()
+
+
+def load_state(state_path):
+    '''
+    returns the saved state dict, None if there is no readable state file
+    '''
+    try:
+        with np.load(state_path, allow_pickle=False) as saved:
+            return {name: saved[name] for name in saved.files}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_state(state_path, state):
+    #write next to the target and rename, so an interrupted run never leaves half a state file
+    partial = state_path + ".partial"
+    with open(partial, "wb") as f:
+        np.savez(f, **state)
+    os.replace(partial, state_path)
+
+
+def incremental_windows(state_path, fn, store, window_lengths, args=(), workers=None, chunk_size=None):
+    '''
+    input: state_path (str, file holding the previous run's results), fn (map_windows function taking
+        (growth, prefix, starts, lengths, *args)), store (ReturnStore), window_lengths (lst of int, rows
+        per window), args (tuple passed to fn), workers and chunk_size (see map_windows)
+    returns (values, starts, lengths, computed): results for every full window in rolling_windows order,
+        and how many windows had to be computed this run
+    '''
+    window_lengths = [int(length) for length in window_lengths]
+    args = tuple(args)
+    row_count = len(store)
+    key = run_key(fn, window_lengths, args)
+    starts, lengths = rolling_windows(row_count, window_lengths)
+
+    state = load_state(state_path)
+    reusable = (state is not None and str(state["key"]) == key and int(state["row_count"]) <= row_count and
+        str(state["digest"]) == rows_digest(store, int(state["row_count"])))
+    if reusable:
+        #only windows that end in rows added since the last run are new
+        new = starts > int(state["row_count"]) - lengths
+        reusable = len(state["values"]) == int((~new).sum())
+
+    if reusable:
+        computed = int(new.sum())
+
+        values = np.empty((len(starts),) + state["values"].shape[1:], dtype=state["values"].dtype)
+        values[~new] = state["values"]
+        if computed:
+            values[new] = map_windows(fn, store.growth, (starts[new], lengths[new]), args, workers, chunk_size,
+                store.log_prefix())
+    else:
+        computed = len(starts)
+        values = map_windows(fn, store.growth, (starts, lengths), args, workers, chunk_size, store.log_prefix())
+
+    instrument.count("incremental_windows_computed", computed)
+    instrument.count("incremental_windows_reused", len(starts) - computed)
+    save_state(state_path, {"key": np.array(key), "row_count": np.array(row_count),
+        "digest": np.array(rows_digest(store, row_count)), "values": values})
+    return values, starts, lengths, computed
@@ -0,0 +1,201 @@
+'''
+per-stage timers and counters for the engine and the scripts
+
+collection is off unless enable() is called (or RETURNS_ENGINE_INSTRUMENT=1 is set); while off, stage()
+hands back a shared do-nothing context manager and count() returns after one check, so the hooks can stay
+in hot paths. report() returns everything collected as a dict, report_json() as json.
+
+stages: csv_parse, date_index, window_construction, simulation, output_write, plus whatever callers add.
+counters: portfolio_simulations, rows_simulated (return rows applied to each portfolio or position, by the
+month by month Portfolio methods and the batched kernels alike), rebalance_events, store_cache_hits/misses,
+disk_cache_hits/misses, incremental_windows_reused/computed, scenario_paths. work done inside pool workers is
+timed as one simulation stage in the parent; counters incremented in worker processes are not collected.
+
+usage:
+    with instrument.capture(cprofile=True, memory=True):
+        rolling_pd_comparison(10, "rebalance.csv")
+    print(instrument.report_json())
+'''
+import contextlib
+import functools
+import io
+import json
+import os
+import time
+
+
+_enabled = os.environ.get("RETURNS_ENGINE_INSTRUMENT", "") not in ("", "0")
+
+#form {stage: [calls, total seconds, longest call in seconds]}
+_stages = {}
+#form {counter: count}
+_counters = {}
+#cprofile / tracemalloc results of the last capture
+_profile = {}
+
+
+class _Stage(object):
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        entry = _stages.get(self.name)
+        if entry is None:
+            _stages[self.name] = [1, elapsed, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+            if elapsed > entry[2]:
+                entry[2] = elapsed
+        return False
+
+
+class _NullStage(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name):
+    '''
+    returns context manager timing its block under name (a no-op while collection is off)
+    '''
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def timed(name):
+    '''
+    decorator timing every call of the function as stage name
+    '''
+    def decorate(fn):
+        @functools.wraps(fn)
+        def fn_with_timing(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Stage(name):
+                return fn(*args, **kwargs)
+        return fn_with_timing
+    return decorate
+
+
+def count(name, amount=1):
+    '''
+    adds amount to counter name while collection is on
+    '''
+    if _enabled:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def enabled():
+    return _enabled
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    '''
+    clears all collected timers, counters and profiles
+    '''
+    _stages.clear()
+    _counters.clear()
+    _profile.clear()
+
+
+def report():
+    '''
+    returns dict of form {"enabled": bool, "stages": {stage: {"calls", "seconds", "max_seconds"}},
+        "counters": {counter: count}, "profile": {...}} with results of the last capture, if any
+    '''
+    return {
+        "enabled": _enabled,
+        "stages": {name: {"calls": calls, "seconds": seconds, "max_seconds": longest}
+            for name, (calls, seconds, longest) in _stages.items()},
+        "counters": dict(_counters),
+        "profile": dict(_profile),
+    }
+
+
+def report_json(indent=2):
+    return json.dumps(report(), indent=indent)
+
+
+def _cprofile_summary(profiler, top):
+    import pstats
+
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, function), (calls, primitive, own, cumulative, callers) in stats.stats.items():
+        rows.append({"function": "{}:{}({})".format(os.path.basename(filename), line, function),
+            "calls": calls, "own_seconds": own, "cumulative_seconds": cumulative})
+    rows.sort(key=lambda row: row["cumulative_seconds"], reverse=True)
+    return rows[:top]
+
+
+@contextlib.contextmanager
+def capture(cprofile=False, memory=False, top=20):
+    '''
+    turns collection on for the block (restoring the previous setting after), optionally under cProfile
+    and tracemalloc; their top entries are added to report()["profile"] as "cprofile" and "memory"
+    '''
+    global _enabled
+    was_enabled = _enabled
+    _enabled = True
+
+    profiler = None
+    if cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+    if memory:
+        import tracemalloc
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        _profile["wall_seconds"] = time.perf_counter() - start
+        if profiler is not None:
+            _profile["cprofile"] = _cprofile_summary(profiler, top)
+        if memory:
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            _profile["memory"] = {
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "top": [{"location": str(stat.traceback[0]), "bytes": stat.size, "blocks": stat.count}
+                    for stat in snapshot.statistics("lineno")[:top]],
+            }
+            if not was_tracing:
+                tracemalloc.stop()
+        _enabled = was_enabled
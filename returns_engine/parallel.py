@@ -0,0 +1,229 @@
+'''
+process pool execution of rolling-window work, with the return matrix placed once in shared memory
+'''
+import collections
+import contextlib
+import os
+
+import numpy as np
+
+from returns_engine import instrument
+from returns_engine.rolling import log_growth_prefix, window_growth
+from returns_engine.simulate import simulate_rebalanced, simulate_rebalanced_calendar, simulate_threshold
+
+
+#growth matrix and prefix sums attached in each worker process by _attach
+_worker_state = {}
+
+
+def _attach(name, shape, dtype):
+    '''
+    pool initializer: map the shared return matrix and build its prefix sums once per worker
+    '''
+    from multiprocessing import shared_memory
+
+    #pool workers share the parent's resource tracker, so attaching here does not take ownership;
+    #the parent unlinks the segment once the pool is done
+    shm = shared_memory.SharedMemory(name=name)
+    growth = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _worker_state["shm"] = shm
+    _worker_state["growth"] = growth
+    _worker_state["prefix"] = log_growth_prefix(growth)
+
+
+def _run_chunk(fn, window_arrays, args):
+    return fn(_worker_state["growth"], _worker_state["prefix"], *(window_arrays + args))
+
+
+def end_values_chunk(growth, prefix, starts, lengths, start_value):
+    '''
+    window function for map_windows: ending values of unbalanced positions (windows x assets)
+    '''
+    instrument.count("rows_simulated", int(np.sum(lengths)) * growth.shape[1])
+    return start_value * window_growth(prefix, starts, lengths)
+
+
+def rebalanced_chunk(growth, prefix, starts, lengths, weights, schedules, start_value):
+    '''
+    window function for map_windows: rebalanced ending values (windows x allocations x schedules)
+    '''
+    weights = np.atleast_2d(weights)
+    cube = np.empty((len(starts), len(weights), len(schedules)))
+    for length in np.unique(lengths).tolist():
+        windows = lengths == length
+        cube[windows] = simulate_rebalanced(growth, weights, schedules, starts[windows], length, start_value, prefix)
+    return cube
+
+
+def calendar_rebalanced_chunk(growth, prefix, starts, lengths, month_ordinals, weights, schedules, start_value):
+    '''
+    window function for map_windows: rebalanced ending values of calendar windows of any length
+    (windows x allocations x schedules), rebalancing on month boundaries
+    '''
+    return simulate_rebalanced_calendar(growth, weights, schedules, starts, lengths, month_ordinals, start_value,
+        prefix)
+
+
+def threshold_chunk(growth, prefix, starts, lengths, weights, thresholds, start_value, cost):
+    '''
+    window function for map_windows: drift band rebalancing of windows of any length, returns
+    (windows x allocations x thresholds x 3) with ending value, rebalances and turnover along the last axis
+    '''
+    return np.stack(simulate_threshold(growth, weights, thresholds, starts, lengths, start_value, cost, prefix),
+        axis=-1)
+
+
+def default_workers():
+    '''
+    returns number of cpus this process may run on
+    '''
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+@contextlib.contextmanager
+def _shared_pool(growth, workers):
+    '''
+    process pool whose workers map growth from shared memory (see _attach); the segment is freed on exit
+    '''
+    #multiprocessing is only imported once a run is parallel, serial runs and short scripts skip it
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
+
+    growth = np.ascontiguousarray(growth)
+    shm = shared_memory.SharedMemory(create=True, size=max(growth.nbytes, 1))
+    try:
+        np.ndarray(growth.shape, dtype=growth.dtype, buffer=shm.buf)[...] = growth
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                initargs=(shm.name, growth.shape, growth.dtype.str)) as pool:
+            yield pool
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def map_windows(fn, growth, window_arrays, args=(), workers=None, chunk_size=None, prefix=None):
+    '''
+    input: fn (module level function fn(growth, prefix, *window_arrays, *args) returning an array with
+        one entry per window along axis 0), growth (float array, rows x assets), window_arrays (tuple of
+        arrays with one entry per window, e.g. (starts, lengths)), args (tuple, passed to every call),
+        workers (int, processes to use; None or 1 runs in this process), chunk_size (int, windows per task),
+        prefix (optional precomputed log_growth_prefix(growth), serial path only)
+    returns fn's results for every window, concatenated in window order
+
+    with workers > 1 the windows are split into chunks run on a process pool. the growth matrix is
+    copied once into shared memory that every worker maps, so tasks only carry their window indexes.
+    '''
+    window_arrays = tuple(np.asarray(array) for array in window_arrays)
+    args = tuple(args)
+    window_count = len(window_arrays[0])
+
+    if workers is None or workers <= 1 or window_count == 0:
+        with instrument.stage("simulation"):
+            if prefix is None:
+                prefix = log_growth_prefix(growth)
+            return fn(growth, prefix, *(window_arrays + args))
+
+    if chunk_size is None:
+        #a few chunks per worker keeps the pool busy when chunks take uneven time
+        chunk_size = max(1, -(-window_count // (workers * 4)))
+    bounds = range(0, window_count, chunk_size)
+
+    with instrument.stage("simulation"), _shared_pool(growth, workers) as pool:
+        futures = [pool.submit(_run_chunk, fn, tuple(array[start:start + chunk_size] for array in window_arrays),
+            args) for start in bounds]
+        results = [future.result() for future in futures]
+
+    return np.concatenate(results, axis=0)
+
+
+def iter_pool_chunks(fn, growth, chunks, args=(), workers=2, in_flight=None):
+    '''
+    input: fn, growth, args as for map_windows, chunks (iterable of window_arrays tuples, one task each),
+        workers (int, processes), in_flight (int, tasks submitted ahead of the one being yielded; default 2
+        per worker)
+    yields (chunk, values) for every chunk, in the order given
+
+    chunks are only taken from the iterable as tasks are submitted, so at most in_flight chunks of window
+    indexes and results exist at a time however many windows there are, as in the serial generators
+    '''
+    if in_flight is None:
+        in_flight = 2 * workers
+    args = tuple(args)
+    chunks = iter(chunks)
+    pending = collections.deque()
+    with _shared_pool(growth, workers) as pool:
+        while True:
+            for chunk in chunks:
+                pending.append((chunk, pool.submit(_run_chunk, fn, chunk, args)))
+                if len(pending) >= in_flight:
+                    break
+            if not pending:
+                return
+            chunk, future = pending.popleft()
+            with instrument.stage("simulation"):
+                values = future.result()
+            yield chunk, values
+
+
+def fixed_chunks(row_count, window_lengths, chunk_size=4096):
+    '''
+    input: row_count (int, rows of return data), window_lengths (lst of int, rows per window), chunk_size
+    yields (starts, lengths) int arrays for consecutive chunks of the windows of rolling_windows, built as
+    they are asked for
+    '''
+    for length in window_lengths:
+        count = max(row_count - length + 1, 0)
+        for first in range(0, count, chunk_size):
+            starts = np.arange(first, min(first + chunk_size, count), dtype=np.int64)
+            yield starts, np.full(len(starts), length, dtype=np.int64)
+
+
+def iter_windows(fn, growth, window_lengths, args=(), chunk_size=4096, prefix=None, workers=None):
+    '''
+    input: fn (window function as for map_windows), growth (float array, rows x assets), window_lengths
+        (lst of int, rows per window), args (tuple, passed to every call), chunk_size (int, windows per chunk),
+        prefix (optional precomputed log_growth_prefix(growth)), workers (int, processes; None or 1 runs in
+        this process)
+    yields (length, starts, values) for consecutive chunks of windows, in rolling_windows order
+
+    only one chunk of window indexes and results exists at a time (a few per worker with workers > 1, see
+    iter_pool_chunks), so memory does not grow with the number of windows
+    '''
+    chunks = fixed_chunks(growth.shape[0], window_lengths, chunk_size)
+    if workers is not None and workers > 1:
+        for (starts, lengths), values in iter_pool_chunks(fn, growth, chunks, args, workers):
+            yield int(lengths[0]), starts, values
+        return
+
+    if prefix is None:
+        prefix = log_growth_prefix(growth)
+    args = tuple(args)
+    for starts, lengths in chunks:
+        with instrument.stage("simulation"):
+            values = fn(growth, prefix, starts, lengths, *args)
+        yield int(lengths[0]), starts, values
+
+
+def iter_window_chunks(fn, growth, window_arrays, args=(), chunk_size=4096, prefix=None, workers=None):
+    '''
+    input: fn, growth, args, prefix, workers as for iter_windows, window_arrays (tuple of arrays with one entry
+        per window, e.g. (starts, lengths) from DateIndex.calendar_windows)
+    yields (window_arrays chunk, values) for consecutive chunks of the given windows
+    '''
+    window_arrays = tuple(np.asarray(array) for array in window_arrays)
+    chunks = (tuple(array[first:first + chunk_size] for array in window_arrays)
+        for first in range(0, len(window_arrays[0]), chunk_size))
+    if workers is not None and workers > 1:
+        for chunk, values in iter_pool_chunks(fn, growth, chunks, args, workers):
+            yield chunk, values
+        return
+
+    if prefix is None:
+        prefix = log_growth_prefix(growth)
+    args = tuple(args)
+    for chunk in chunks:
+        with instrument.stage("simulation"):
+            values = fn(growth, prefix, *(chunk + args))
+        yield chunk, values
@@ -0,0 +1,306 @@
+'''
+column-generic ReturnData / Portfolio shared by rebalance.py and growth_value.py
+
+asset columns come from the csv header (see store.read_return_csv), and portfolios hold one value per
+asset column, so any number of indices is handled by the same array updates
+'''
+import numpy as np
+
+from returns_engine import instrument
+from returns_engine.rolling import window_growth
+from returns_engine.store import load_return_store
+
+
+def rebalance_points(month_ordinals, rebalance_every):
+    '''
+    input: month_ordinals (int array, month of each row of a period), rebalance_every (int, months between
+        rebalances, 0 for never)
+    returns bool array, True after the rows a portfolio is rebalanced after: the last row before each
+        rebalance_every-th calendar month from the period's first month, and the last row when the period
+        ends just before one. on monthly rows this is every rebalance_every-th row
+    '''
+    rebalanced = np.zeros(len(month_ordinals), dtype=bool)
+    if not rebalance_every or len(month_ordinals) == 0:
+        return rebalanced
+    blocks = (np.asarray(month_ordinals) - month_ordinals[0]) // rebalance_every
+    rebalanced[:-1] = np.diff(blocks) > 0
+    rebalanced[-1] = (month_ordinals[-1] + 1 - month_ordinals[0]) // rebalance_every > blocks[-1]
+    return rebalanced
+
+
+class ReturnData(object):
+    '''
+    attributes: filename, asset_columns (None for every column named in the header, int for the first n
+        columns after the date, or lst of header names), return_store (ReturnStore, loaded on first use)
+    '''
+    asset_columns = None
+
+    def __init__(self, filename, return_store=None, asset_columns=None):
+        self.filename = filename
+        self.return_store = return_store
+        if asset_columns is not None:
+            self.asset_columns = asset_columns
+        self.ordered_dates = None
+        self.rolling_periods = None
+        self.rolling_period_length = None
+
+    def get_return_store(self):
+        '''
+        returns the parsed return matrix for self.filename, shared by every ReturnData/Portfolio
+        built from the same file, so the csv is only read once
+        '''
+        if self.return_store is None:
+            self.return_store = load_return_store(self.filename, self.asset_columns)
+        return self.return_store
+
+    def get_columns(self):
+        '''
+        returns names of the asset columns, in file order
+        '''
+        return self.get_return_store().columns
+
+    def get_return_data(self):
+        '''
+        returns dict of monthly returns in percent, form {date: [return of each asset column]}
+        '''
+        return self.get_return_store().as_dict()
+
+    def get_ordered_dates(self):
+        if self.ordered_dates is None:
+            self.ordered_dates = self.get_return_store().dates
+        return self.ordered_dates
+
+    def beginning_of_month(self, your_date):
+        '''
+        input m/d/yyyy (str), return first of the month (str, m/1/yyyy)
+        '''
+        return self.get_return_store().calendar.beginning_of_month(your_date)
+
+    def end_of_month(self, your_date, ordered_dates=None):
+        '''
+        input m/yyyy or m/d/yyyy (str)
+        return last business day of given month, looked up by month in the date index
+        (ordered_dates is no longer needed, the index is built from the file's dates)
+        '''
+        return self.get_return_store().calendar.end_of_month(your_date)
+
+    def period_start(self, your_date):
+        '''
+        input m/yyyy or m/d/yyyy (str)
+        returns the date in the file a period starting then begins at: the last business day of the month
+        for monthly files (as end_of_month), the first date on or after it for daily and weekly files
+        '''
+        return self.get_return_store().calendar.period_start(your_date)
+
+    def get_rolling_periods(self, length=25, step=None):
+        '''
+        input: length of each rolling period in years (int), step (how often a period starts, "daily",
+            "weekly" or "monthly"; None for every row of the file)
+        returns rolling periods in list of tuples
+        '''
+        if self.rolling_periods is not None and self.rolling_period_length == (length, step):
+            return self.rolling_periods
+        else:
+            calendar = self.get_return_store().calendar
+            if calendar.fixed_windows(step):
+                #window starting at row i ends at row i + months - 1
+                months = length * 12
+                period_count = max(len(calendar) - months + 1, 0)
+                with instrument.stage("window_construction"):
+                    self.rolling_periods = list(zip(calendar.month_start_labels[:period_count],
+                        calendar.dates[months - 1:]))
+            else:
+                starts, lengths = calendar.calendar_windows([length], step)
+                with instrument.stage("window_construction"):
+                    self.rolling_periods = [(calendar.start_labels[start], calendar.dates[end]) for start, end in
+                        zip(starts.tolist(), (starts + lengths - 1).tolist())]
+            self.rolling_period_length = (length, step)
+            return self.rolling_periods
+
+
+class Portfolio(ReturnData):
+    '''
+    attributes: starting_value, weights (array, proportion of the starting value in each asset column;
+        also the target proportions when rebalancing)
+    portfolio values are lists of form [total value, value in each asset column]
+    '''
+
+    def __init__(self, start_value, weights, filename, return_store=None, asset_columns=None):
+        self.starting_value = start_value
+        self.weights = np.asarray(weights, dtype=np.float64)
+        ReturnData.__init__(self, filename, return_store, asset_columns)
+
+    def starting_portfolio(self):
+        '''
+        return initial portfolio allocation
+        '''
+        return [self.starting_value] + (self.starting_value * self.weights).tolist()
+
+    def date_range(self, start_of_period, end_of_period):
+        '''
+        inputs: start_of_period (str, m/d/yyyy), end_of_period
+        returns ordered list of all dates in date range
+        '''
+        calendar = self.get_return_store().calendar
+        start_row = calendar.row(start_of_period)
+        end_row = calendar.row(end_of_period)
+
+        date_range = [calendar.month_start_labels[start_row]]
+        date_range.extend(calendar.dates[start_row:end_row + 1])
+
+        return date_range
+
+    def simulate(self, starting_portfolio, date_range, rebalance_every=0, path=False):
+        '''
+        inputs: starting_portfolio (lst, form [starting val, value in each asset]), date_range (ordered lst
+            of dates in focus range), rebalance_every (int, months between rebalances, 0 for never), path (bool)
+        returns final portfolio values (lst, same form as starting_portfolio); with path=True returns
+            (final values, array of values after every row of date_range, shape (len(date_range) x (assets + 1)))
+        rebalances fall at the first row of every rebalance_every-th calendar month after the one the period
+        starts in (see rebalance_points), as in simulate.simulate_rebalanced_calendar, so a daily file is
+        rebalanced monthly rather than every row. without path, each run of rows between rebalances is
+        applied at once, its growth read from the store's log prefix sums (computed once per file and shared by
+        every period), instead of row by row
+        '''
+        store = self.get_return_store()
+        months = len(date_range) - 1
+        growth_rows = store.growth[:0]
+        rebalanced = np.zeros(months, dtype=bool)
+        if months > 0:
+            first_row = store.row(date_range[1])
+            growth_rows = store.growth[first_row:first_row + months]
+            rebalanced = rebalance_points(store.calendar.month_ordinals[first_row:first_row + months],
+                rebalance_every)
+
+        instrument.count("portfolio_simulations")
+        instrument.count("rows_simulated", months)
+        if rebalance_every:
+            instrument.count("rebalance_events", int(rebalanced.sum()))
+        total = starting_portfolio[0]
+        holdings = np.array(starting_portfolio[1:], dtype=np.float64)
+
+        if not path:
+            #final values only: the growth of every run of rows between rebalances is a difference of two
+            #log prefix entries, so overlapping periods share the prefix instead of multiplying their rows again.
+            #every run after the first starts rebalanced, so it scales the total by weights . run growth
+            if months == 0:
+                return [float(total)] + holdings.tolist()
+            offsets = np.concatenate([[0], np.flatnonzero(rebalanced[:-1]) + 1])
+            run_growth = window_growth(store.log_prefix(), first_row + offsets, np.diff(np.append(offsets, months)))
+
+            holdings *= run_growth[0]
+            total = holdings.sum()
+            if len(offsets) > 1:
+                total *= np.prod((run_growth[1:-1] * self.weights).sum(axis=1))
+                np.multiply(self.weights, total, out=holdings)
+                holdings *= run_growth[-1]
+                total = holdings.sum()
+            if rebalanced[-1]:
+                np.multiply(self.weights, total, out=holdings)
+            return [float(total)] + holdings.tolist()
+
+        values = np.empty((months + 1, len(holdings) + 1))
+        values[0] = starting_portfolio
+        for month in range(1, months + 1):
+            holdings *= growth_rows[month - 1]
+            total = holdings.sum()
+            if rebalanced[month - 1]:
+                np.multiply(self.weights, total, out=holdings)
+            values[month, 0] = total
+            values[month, 1:] = holdings
+
+        return [float(total)] + holdings.tolist(), values
+
+    def rebalance(self, current_port_values):
+        '''
+        input current portfolio values, form [total_val, value in each asset]
+        output same total value rebalanced according to initial allocations
+        '''
+        total_val = current_port_values[0]
+        return [total_val] + (total_val * self.weights).tolist()
+
+    def untouched_returns(self, starting_portfolio, date_range):
+        '''
+        inputs: starting_portfolio (lst, form [starting val, value in each asset]),
+            date_range (ordered lst of dates in focus range)
+        returns dict of monthly values for unbalanced portfolio, form {date: [total value, value in each asset]}
+        (use simulate when only the final value is needed)
+        '''
+        final, values = self.simulate(starting_portfolio, date_range, 0, path=True)
+        return dict(zip(date_range, values.tolist()))
+
+    def monthly_rebalanced(self, starting_portfolio, date_range):
+        '''
+        same as untouched but with monthly rebalancing
+        '''
+        final, values = self.simulate(starting_portfolio, date_range, 1, path=True)
+        return dict(zip(date_range, values.tolist()))
+
+    def annually_rebalanced(self, starting_portfolio, date_range):
+        '''
+        same as untouched but with annual rebalancing
+        '''
+        final, values = self.simulate(starting_portfolio, date_range, 12, path=True)
+        return dict(zip(date_range, values.tolist()))
+
+    def simulate_threshold(self, starting_portfolio, date_range, threshold, cost=0.0, path=False):
+        '''
+        inputs: starting_portfolio, date_range, path as for simulate, threshold (float, rebalance once any
+            asset's share of the portfolio is more than this far from its weight, e.g. 0.05), cost (float,
+            transaction cost per unit traded, taken from the total at each rebalance)
+        returns (final portfolio values, rebalances, turnover); with path=True also the array of values after
+            every month, as for simulate
+        drift is checked at the end of every month, and a breach rebalances before the next month. the path
+        depends on every breach, so this steps month by month; rolling comparisons over many windows use the
+        batched simulate.simulate_threshold instead
+        '''
+        store = self.get_return_store()
+        months = len(date_range) - 1
+        first_row = store.row(date_range[1]) if months > 0 else 0
+        instrument.count("portfolio_simulations")
+        instrument.count("rows_simulated", months)
+        total = starting_portfolio[0]
+        holdings = np.array(starting_portfolio[1:], dtype=np.float64)
+
+        rebalances = 0
+        turnover = 0.0
+        values = np.empty((months + 1, len(holdings) + 1)) if path else None
+        if path:
+            values[0] = starting_portfolio
+        for month in range(1, months + 1):
+            holdings *= store.growth[first_row + month - 1]
+            total = holdings.sum()
+            drift = np.abs(holdings / total - self.weights)
+            if month < months and drift.max() > threshold:
+                total *= 1 - cost * drift.sum()
+                np.multiply(self.weights, total, out=holdings)
+                rebalances += 1
+                turnover += float(drift.sum()) / 2
+            if path:
+                values[month, 0] = total
+                values[month, 1:] = holdings
+
+        if rebalances:
+            instrument.count("rebalance_events", rebalances)
+        if path:
+            return [float(total)] + holdings.tolist(), rebalances, turnover, values
+        return [float(total)] + holdings.tolist(), rebalances, turnover
+
+    def threshold_rebalanced(self, starting_portfolio, date_range, threshold=0.05, cost=0.0):
+        '''
+        same as untouched but rebalanced whenever an asset drifts more than threshold from its weight
+        (see simulate_threshold)
+        '''
+        final, rebalances, turnover, values = self.simulate_threshold(starting_portfolio, date_range, threshold,
+            cost, path=True)
+        return dict(zip(date_range, values.tolist()))
+
+    def get_rebal_comparison(self, start_date, end_date, rebalance_every=(0, 1, 12)):
+        '''
+        returns final total value for each rebalancing frequency (tuple, default unbalanced, monthly, annual)
+        '''
+        date_range = self.date_range(start_date, end_date)
+        starting_portfolio = self.starting_portfolio()
+
+        #final values only, without keeping every month's holdings
+        return tuple(self.simulate(starting_portfolio, date_range, months)[0] for months in rebalance_every)
@@ -0,0 +1,69 @@
+'''
+vectorized rolling-window engine: buy-and-hold window values from prefix sums of log(1 + r)
+'''
+import numpy as np
+
+from returns_engine import instrument
+
+
+def log_growth_prefix(growth):
+    '''
+    input: growth (float array, rows x assets, 1 + return)
+    returns (log_prefix, missing_prefix), both shape (rows + 1) x assets with a leading row of zeros:
+        log_prefix[i] = sum of log(growth) over rows before i (missing values count as 0)
+        missing_prefix[i] = number of missing (nan) values over rows before i
+    '''
+    missing = np.isnan(growth)
+    log_growth = np.log(np.where(missing, 1.0, growth))
+
+    log_prefix = np.zeros((growth.shape[0] + 1, growth.shape[1]))
+    np.cumsum(log_growth, axis=0, out=log_prefix[1:])
+    missing_prefix = np.zeros((growth.shape[0] + 1, growth.shape[1]), dtype=np.int64)
+    np.cumsum(missing, axis=0, out=missing_prefix[1:])
+    return log_prefix, missing_prefix
+
+
+def window_growth(prefix, starts, lengths):
+    '''
+    input: prefix (tuple from log_growth_prefix), starts (int array, first row of each window),
+        lengths (int array or int, rows in each window)
+    returns growth of every asset over every window (array, windows x assets), nan where the
+    window touches a missing value
+    '''
+    log_prefix, missing_prefix = prefix
+    ends = starts + lengths
+    growth = np.exp(log_prefix[ends] - log_prefix[starts])
+    growth[missing_prefix[ends] != missing_prefix[starts]] = np.nan
+    return growth
+
+
+def rolling_windows(row_count, window_lengths):
+    '''
+    input: row_count (int, rows of return data), window_lengths (iterable of int, rows per window)
+    returns (starts, lengths) int arrays listing every full window, grouped by length in the
+    order given and ordered by start row within each length
+    '''
+    with instrument.stage("window_construction"):
+        starts = [np.empty(0, dtype=np.int64)]
+        lengths = [np.empty(0, dtype=np.int64)]
+        for length in window_lengths:
+            count = max(row_count - length + 1, 0)
+            starts.append(np.arange(count, dtype=np.int64))
+            lengths.append(np.full(count, length, dtype=np.int64))
+        return np.concatenate(starts), np.concatenate(lengths)
+
+
+def rolling_end_values(growth, window_lengths, start_value=1.0, prefix=None):
+    '''
+    input: growth (float array, rows x assets, 1 + return), window_lengths (iterable of int,
+        rows per window), start_value (value each asset starts a window with),
+        prefix (optional precomputed log_growth_prefix(growth))
+    returns (values, starts, lengths):
+        values (array, windows x assets) ending value of an unbalanced position in each asset
+        starts, lengths (int arrays) first row and row count of each window, as in rolling_windows
+    '''
+    if prefix is None:
+        prefix = log_growth_prefix(growth)
+    starts, lengths = rolling_windows(growth.shape[0], window_lengths)
+    values = start_value * window_growth(prefix, starts, lengths)
+    return values, starts, lengths
@@ -0,0 +1,173 @@
+'''
+monte carlo scenarios: synthetic return paths drawn from a parsed return matrix, run through the same
+buy-and-hold-between-rebalances logic as Portfolio.simulate
+
+two generators:
+    bootstrap    moving block bootstrap, paths are blocks of consecutive historical months glued together,
+                 keeping the cross-asset correlation and some of the autocorrelation of the history
+    parametric   multivariate normal log returns with the history's mean and covariance
+
+paths are seeded in fixed blocks of SEED_BLOCK paths, each block from its own index, and drawn and simulated
+a few blocks at a time, as many as fit a memory budget. the budget and the worker count only decide how blocks
+are grouped, so the same seed gives the same outcomes on any budget, serially or on every core.
+'''
+import numpy as np
+
+from returns_engine import instrument
+from returns_engine.parallel import map_windows
+from returns_engine.simulate import portfolio_growth, schedule_months
+
+
+SCENARIO_METHODS = ("bootstrap", "parametric")
+
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+#paths drawn from each seed, the unit results are reproducible in
+SEED_BLOCK = 1024
+
+
+def complete_history(growth):
+    '''
+    input growth (float array, rows x assets)
+    returns the longest run of consecutive rows with a value for every asset (rows x assets view), the
+    history scenarios are drawn from
+    '''
+    complete = ~np.isnan(growth).any(axis=1)
+    #edges of the runs of complete rows, alternating run starts and stops
+    breaks = np.flatnonzero(np.diff(np.concatenate([[0], complete.astype(np.int8), [0]])))
+    if len(breaks) == 0:
+        raise ValueError("no rows have a value for every asset")
+    starts, stops = breaks[::2], breaks[1::2]
+    longest = np.argmax(stops - starts)
+    return growth[starts[longest]:stops[longest]]
+
+
+def monthly_growth(growth, month_ordinals):
+    '''
+    input: growth (float array, rows x assets), month_ordinals (int array, month of each row, ascending)
+    returns growth compounded over each calendar month (array, months x assets), so daily and weekly files
+    give monthly scenario paths; a month with a missing row is missing
+    '''
+    month_ordinals = np.asarray(month_ordinals)
+    firsts = np.flatnonzero(np.diff(month_ordinals, prepend=month_ordinals[0] - 1))
+    if len(firsts) == len(month_ordinals):
+        return np.asarray(growth, dtype=np.float64)
+    return np.multiply.reduceat(np.asarray(growth, dtype=np.float64), firsts, axis=0)
+
+
+def bootstrap_growth(history, rng, paths, months, block=12):
+    '''
+    input: history (float array, rows x assets), rng (np.random.Generator), paths, months (int),
+        block (int, consecutive months per draw)
+    returns growth paths (array, paths x months x assets) made of randomly placed historical blocks
+    '''
+    block = max(1, min(block, len(history)))
+    blocks = -(-months // block)
+    starts = rng.integers(0, len(history) - block + 1, size=(paths, blocks))
+    rows = (starts[:, :, None] + np.arange(block)).reshape(paths, blocks * block)[:, :months]
+    return history[rows]
+
+
+def parametric_growth(mean, cholesky, rng, paths, months):
+    '''
+    input: mean (float array, assets, mean monthly log growth), cholesky (lower triangular factor of the
+        log growth covariance), rng (np.random.Generator), paths, months (int)
+    returns growth paths (array, paths x months x assets) with multivariate normal log growth
+    '''
+    normal = rng.standard_normal((paths, months, len(mean)))
+    return np.exp(normal @ cholesky.T + mean)
+
+
+def paths_rebalanced(path_growth, weights, schedules, start_value=1.0):
+    '''
+    input: path_growth (array, paths x months x assets), weights (array, allocations x assets),
+        schedules (lst of schedule names or ints, see schedule_months), start_value
+    returns ending total values (array, paths x allocations x schedules), each portfolio starting at its
+    weights and rebalanced back to them every k months from the start of the path
+    '''
+    paths, months, assets = path_growth.shape
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    cube = np.empty((paths, len(weights), len(schedules)))
+    instrument.count("rows_simulated", paths * months * len(weights) * len(schedules))
+    for schedule_index, schedule in enumerate(schedules):
+        block = schedule_months(schedule)
+        if block == 0 or block > months:
+            block = months
+        #buy and hold within each block; a short last block is padded with months of no growth
+        blocks = -(-months // block)
+        if block == 1:
+            block_growth = path_growth.reshape(paths * months, assets)
+        else:
+            padded = path_growth
+            if blocks * block != months:
+                padded = np.ones((paths, blocks * block, assets))
+                padded[:, :months] = path_growth
+            block_growth = padded.reshape(paths * blocks, block, assets).prod(axis=1)
+        instrument.count("rebalance_events", paths * len(weights) * (blocks - 1))
+        total = portfolio_growth(block_growth, weights).reshape(paths, blocks, len(weights)).prod(axis=1)
+        cube[:, :, schedule_index] = start_value * total
+    return cube
+
+
+def scenario_paths(history, rng, method, count, months, block, mean, cholesky):
+    '''
+    returns count growth paths (array, count x months x assets) drawn from rng with the given method
+    '''
+    if method == "bootstrap":
+        return bootstrap_growth(history, rng, count, months, block)
+    return parametric_growth(mean, cholesky, rng, count, months)
+
+
+def scenario_chunk(history, prefix, seed_blocks, method, months, block, mean, cholesky, weights, schedules,
+        start_value, seed, paths, group_blocks):
+    '''
+    window function for map_windows: draws and simulates the paths of the given seed blocks, group_blocks
+    blocks at a time
+    returns ending total values (array, paths in these blocks x allocations x schedules)
+    '''
+    cubes = []
+    seed_blocks = seed_blocks.tolist()
+    for first in range(0, len(seed_blocks), group_blocks):
+        path_growth = []
+        for seed_block in seed_blocks[first:first + group_blocks]:
+            count = min(SEED_BLOCK, paths - seed_block * SEED_BLOCK)
+            rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(seed_block,)))
+            path_growth.append(scenario_paths(history, rng, method, count, months, block, mean, cholesky))
+        path_growth = np.concatenate(path_growth, axis=0)
+        instrument.count("scenario_paths", len(path_growth))
+        cubes.append(paths_rebalanced(path_growth, weights, schedules, start_value))
+    return np.concatenate(cubes, axis=0)
+
+
+def simulate_scenarios(growth, weights, schedules, months, paths=10000, method="bootstrap", block=12, seed=0,
+        start_value=1.0, workers=None, memory_budget=DEFAULT_MEMORY_BUDGET):
+    '''
+    input: growth (float array, months x assets, 1 + return, see monthly_growth), weights (array, allocations x
+        assets), schedules (lst of schedule names or ints, see schedule_months), months (int, path length),
+        paths (int, number of paths), method ("bootstrap" or "parametric"), block (int, months per bootstrap
+        draw), seed (int), start_value, workers (int, processes; None runs serially), memory_budget (int,
+        bytes the paths simulated at once may use, per worker; at least one SEED_BLOCK is always drawn whole)
+    returns ending total values (array, paths x allocations x schedules)
+    '''
+    if method not in SCENARIO_METHODS:
+        raise ValueError("unknown scenario method {!r}, expected one of {}".format(method,
+            ", ".join(SCENARIO_METHODS)))
+    history = np.ascontiguousarray(complete_history(np.asarray(growth, dtype=np.float64)))
+    if method == "bootstrap" and len(history) < 2:
+        raise ValueError("need at least 2 complete rows of history to bootstrap")
+
+    assets = history.shape[1]
+    mean = cholesky = None
+    if method == "parametric":
+        log_growth = np.log(history)
+        mean = log_growth.mean(axis=0)
+        covariance = np.atleast_2d(np.cov(log_growth, rowvar=False))
+        #a tiny ridge keeps the factorisation working for perfectly correlated columns
+        cholesky = np.linalg.cholesky(covariance + np.eye(assets) * 1e-12)
+
+    #path growth, bootstrap rows and the padded block copy dominate the memory of the paths simulated at once
+    group_blocks = max(1, int(memory_budget // (SEED_BLOCK * months * (assets * 8 * 3 + 8))))
+    seed_blocks = np.arange(-(-paths // SEED_BLOCK))
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    args = (method, months, block, mean, cholesky, weights, list(schedules), start_value, seed, paths, group_blocks)
+    return map_windows(scenario_chunk, history, (seed_blocks,), args, workers, group_blocks)
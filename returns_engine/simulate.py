@@ -0,0 +1,285 @@
+'''
+batched rebalancing simulator: many allocations, rebalance schedules and rolling windows at once
+'''
+import numpy as np
+
+from returns_engine import instrument
+
+from returns_engine.rolling import log_growth_prefix, window_growth
+
+
+#months between rebalances for the named schedules, 0 = never rebalanced
+SCHEDULES = {
+    "none": 0,
+    "monthly": 1,
+    "quarterly": 3,
+    "annual": 12,
+}
+
+
+def schedule_months(schedule):
+    '''
+    input schedule name ("none", "monthly", "quarterly", "annual") or int k (rebalance every k months)
+    returns months between rebalances, 0 for never
+    '''
+    if isinstance(schedule, str):
+        if schedule not in SCHEDULES:
+            raise ValueError("unknown rebalance schedule {!r}, expected one of {} or a number of months"
+                .format(schedule, ", ".join(SCHEDULES)))
+        return SCHEDULES[schedule]
+    months = int(schedule)
+    if months < 0:
+        raise ValueError("rebalance schedule must be a non-negative number of months, got {}".format(schedule))
+    return months
+
+
+def portfolio_growth(asset_growth, weights):
+    '''
+    input: asset_growth (array, windows x assets), weights (array, allocations x assets)
+    returns growth of each allocation in each window (array, windows x allocations)
+    '''
+    #summed asset by asset rather than with a matmul, so a window's result never depends on how many
+    #windows are computed together and chunked (parallel) runs match serial runs exactly
+    growth = asset_growth[:, :1] * weights[:, 0]
+    for asset in range(1, weights.shape[1]):
+        growth += asset_growth[:, asset:asset + 1] * weights[:, asset]
+    return growth
+
+
+def simulate_rebalanced(growth, weights, schedules, starts, length, start_value=1.0, prefix=None):
+    '''
+    input: growth (float array, rows x assets, 1 + return), weights (array, allocations x assets,
+        target proportion of the portfolio in each asset), schedules (lst of schedule names or ints,
+        see schedule_months), starts (int array, first row of each window), length (int, rows per window),
+        start_value (starting total value), prefix (optional precomputed log_growth_prefix(growth))
+    returns ending total values, array of shape (windows x allocations x schedules)
+
+    a portfolio rebalanced every k months is buy-and-hold within each k month block, so its value over a
+    block is total * (weights . block growth). every window and allocation steps block by block together,
+    using the prefix sums for block growth,, instead of month by month per portfolio.
+    '''
+    if prefix is None:
+        prefix = log_growth_prefix(growth)
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    starts = np.asarray(starts, dtype=np.int64)
+
+    cube = np.empty((len(starts), len(weights), len(schedules)))
+    #every portfolio covers every row of its window, however few steps the blocks take
+    instrument.count("rows_simulated", len(starts) * length * len(weights) * len(schedules))
+    for schedule_index, schedule in enumerate(schedules):
+        block = schedule_months(schedule)
+        if block == 0 or block > length:
+            block = length
+
+        #every block boundary inside a window rebalances every allocation
+        instrument.count("rebalance_events", len(starts) * len(weights) * max(-(-length // block) - 1, 0))
+        total = np.full((len(starts), len(weights)), float(start_value))
+        for offset in range(0, length, block):
+            rows = min(block, length - offset)
+            total *= portfolio_growth(window_growth(prefix, starts + offset, rows), weights)
+        cube[:, :, schedule_index] = total
+
+    return cube
+
+
+def simulate_rebalanced_calendar(growth, weights, schedules, starts, lengths, month_ordinals, start_value=1.0,
+        prefix=None):
+    '''
+    input: growth, weights, schedules, start_value, prefix as for simulate_rebalanced, starts and lengths
+        (int arrays, first row and row count of each window, lengths may differ), month_ordinals (int array,
+        month ordinal of each row, see DateIndex)
+    returns ending total values, array of shape (windows x allocations x schedules)
+
+    for daily or weekly rows, and windows that start mid month. a portfolio on a k month schedule is
+    rebalanced at the first row of every k-th month after the month its window starts in, which for
+    monthly rows and month-start windows is the same as simulate_rebalanced. the growth of each allocation
+    over every k month block is computed once and summed in logs along every k-th month, so each window
+    only costs its two partial blocks at the ends plus a lookup, however many rows it holds.
+    '''
+    if prefix is None:
+        prefix = log_growth_prefix(growth)
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    starts = np.asarray(starts, dtype=np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    month_ordinals = np.asarray(month_ordinals, dtype=np.int64)
+
+    cube = np.empty((len(starts), len(weights), len(schedules)))
+    if len(starts) == 0:
+        return cube
+    ends = starts + lengths
+    start_months = month_ordinals[starts]
+    last_months = month_ordinals[ends - 1]
+    #blocks run over every month of the file, not just the windows given, so a window's result does not
+    #depend on which other windows are computed with it
+    first_month = int(month_ordinals[0])
+    instrument.count("rows_simulated", int(lengths.sum()) * len(weights) * len(schedules))
+
+    for schedule_index, schedule in enumerate(schedules):
+        months = schedule_months(schedule)
+        if months == 0:
+            cube[:, :, schedule_index] = start_value * portfolio_growth(window_growth(prefix, starts, lengths), weights)
+            continue
+
+        #rebalances fall at the first rows of months start + months, start + 2 * months, ... inside the window
+        rebalances = (last_months - start_months) // months
+        instrument.count("rebalance_events", int(rebalances.sum()) * len(weights))
+        first_rebalance = np.searchsorted(month_ordinals, start_months + months)
+        last_rebalance = np.searchsorted(month_ordinals, start_months + rebalances * months)
+        inside = rebalances > 0
+
+        #growth of every allocation over the k month block starting at each month, summed in logs
+        #along every k-th month so block runs are differences of two entries
+        block_count = int(month_ordinals[-1]) - first_month + 1
+        block_rows = np.searchsorted(month_ordinals, np.arange(first_month, first_month + block_count + months))
+        block_growth = portfolio_growth(window_growth(prefix, block_rows[:block_count],
+            block_rows[months:] - block_rows[:block_count]), weights)
+        padded = -(-block_count // months) * months
+        missing = np.zeros((padded, len(weights)), dtype=np.int64)
+        missing[:block_count] = np.isnan(block_growth)
+        log_growth = np.zeros((padded, len(weights)))
+        log_growth[:block_count] = np.log(np.where(missing[:block_count], 1.0, block_growth))
+        log_growth = np.cumsum(log_growth.reshape(-1, months, len(weights)), axis=0).reshape(padded, -1)
+        missing = np.cumsum(missing.reshape(-1, months, len(weights)), axis=0).reshape(padded, -1)
+
+        head_rows = np.where(inside, first_rebalance, ends) - starts
+        total = start_value * portfolio_growth(window_growth(prefix, starts, head_rows), weights)
+        if inside.any():
+            last_block = (start_months + (rebalances - 1) * months - first_month)[inside]
+            first_block = (start_months - first_month)[inside]
+            middle = np.exp(log_growth[last_block] - log_growth[first_block])
+            middle[missing[last_block] != missing[first_block]] = np.nan
+            tail = portfolio_growth(window_growth(prefix, last_rebalance[inside],
+                ends[inside] - last_rebalance[inside]), weights)
+            total[inside] *= middle * tail
+        cube[:, :, schedule_index] = total
+
+    return cube
+
+
+def _first_breach(levels, rows, limits, weights, thresholds, budget=1 << 22):
+    '''
+    input: levels (float array, rows + 1 x assets, cumulative growth of each asset up to each row, up to a
+        constant per asset), rows (int array, rows portfolios were last rebalanced at),
+        limits (int array, row each search stops at), weights (array, portfolios x assets), thresholds
+        (float array, one per portfolio), budget (int, most floats held by one scan step)
+    returns first row after each of rows at which a portfolio held since then has drifted more than its
+    threshold from its weights (int array), or its limit if it never does before then
+    '''
+    found = limits.copy()
+    pending = np.flatnonzero(rows + 1 < limits)
+    offset = 1
+    span = 4
+    while len(pending):
+        #scan the next span of rows for every portfolio still looking; the span doubles each pass (within
+        #the budget), so nearby breaches cost little and distant ones few passes
+        rows_left = int((limits[pending] - rows[pending]).max()) - offset
+        span = max(1, min(rows_left, budget // (len(pending) * weights.shape[1]), span))
+        ahead = rows[pending, None] + offset + np.arange(span)
+        inside = ahead < limits[pending, None]
+        held = levels[np.minimum(ahead, len(levels) - 1)] * (weights[pending] / levels[rows[pending]])[:, None]
+        total = held.sum(axis=2)
+        held -= weights[pending, None] * total[:, :, None]
+        #drift beyond the band, compared in value rather than share to skip a division
+        breach = (np.abs(held).max(axis=2) > thresholds[pending, None] * total) & inside
+        hit = breach.any(axis=1)
+        found[pending[hit]] = ahead[hit, np.argmax(breach[hit], axis=1)]
+        offset += span
+        span *= 2
+        pending = pending[~hit & (rows[pending] + offset < limits[pending])]
+    return found
+
+
+def simulate_threshold(growth, weights, thresholds, starts, lengths, start_value=1.0, cost=0.0, prefix=None):
+    '''
+    input: growth (float array, rows x assets, 1 + return), weights (array, allocations x assets),
+        thresholds (lst of float, drift band: rebalance once any asset's share of the portfolio is more than
+        this far from its weight, e.g. 0.05 for 5 percentage points), starts (int array, first row of each
+        window), lengths (int or int array, rows per window), start_value (starting total value), cost (float,
+        transaction cost per unit traded, taken from the total at each rebalance), prefix (optional
+        precomputed log_growth_prefix(growth))
+    returns (values, rebalances, turnover), arrays of shape (windows x allocations x thresholds): ending total
+        value, number of rebalances, and turnover (sum over rebalances of the share of the portfolio sold)
+
+    drift is checked after every row, and a breach rebalances before the next row. the holdings after a
+    rebalance at row r only depend on r, so the next breach is found for each distinct (r, allocation,
+    threshold) at once by scanning ahead of r, and each window jumps from breach to breach rather than
+    stepping row by row. breaches are remembered by row, so windows that rebalance on the same row share
+    the rest of the search.
+    '''
+    if prefix is None:
+        prefix = log_growth_prefix(growth)
+    log_prefix = prefix[0]
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    thresholds = np.asarray(thresholds, dtype=np.float64).ravel()
+    starts, lengths = np.broadcast_arrays(np.asarray(starts, dtype=np.int64), np.asarray(lengths, dtype=np.int64))
+    windows, allocations, bands = len(starts), len(weights), len(thresholds)
+
+    #one chain per (window, allocation, threshold), flattened in that order
+    shape = (windows, allocations, bands)
+    allocation = np.broadcast_to(np.arange(allocations)[:, None], shape).ravel()
+    band = np.broadcast_to(np.arange(bands), shape).ravel()
+    row = np.repeat(starts, allocations * bands)
+    end = np.repeat(starts + lengths, allocations * bands)
+    value = np.full(len(row), float(start_value))
+    rebalances = np.zeros(len(row), dtype=np.int64)
+    turnover = np.zeros(len(row))
+
+    #growth between any two rows is a ratio of levels; centring each asset's log prefix keeps them in range
+    levels = np.exp(log_prefix - (log_prefix.max(axis=0) + log_prefix.min(axis=0)) / 2)
+    #next breach after each (allocation and threshold, row) visited, with the limit it was searched up to;
+    #windows whose chains reach the same row, after however many rebalances, reuse it. the memo is a sorted
+    #index over the keys actually visited, so it grows with the work done rather than allocations x
+    #thresholds x rows of the file
+    memo_keys = np.empty(0, dtype=np.int64)
+    memo_breach = np.empty(0, dtype=np.int64)
+    memo_limit = np.empty(0, dtype=np.int64)
+    active = np.flatnonzero(end - row > 1)
+    while len(active):
+        #chains sharing a row, allocation and threshold share their next breach
+        keys = (allocation[active] * bands + band[active]) * len(log_prefix) + row[active]
+        keys, inverse = np.unique(keys, return_inverse=True)
+        limits = np.zeros(len(keys), dtype=np.int64)
+        np.maximum.at(limits, inverse, end[active])
+
+        place = np.searchsorted(memo_keys, keys)
+        seen = np.zeros(len(keys), dtype=bool)
+        found = np.zeros(len(keys), dtype=np.int64)
+        searched_to = np.full(len(keys), -1, dtype=np.int64)
+        if len(memo_keys):
+            inside = place < len(memo_keys)
+            seen[inside] = memo_keys[place[inside]] == keys[inside]
+            found[seen] = memo_breach[place[seen]]
+            searched_to[seen] = memo_limit[place[seen]]
+        #a breach found before the old limit holds for any limit, otherwise the search must have gone as far
+        search = ~((searched_to >= limits) | ((searched_to >= 0) & (found < searched_to)))
+        if search.any():
+            pairs, key_rows = np.divmod(keys[search], len(log_prefix))
+            found[search] = _first_breach(levels, key_rows, limits[search], weights[pairs // bands],
+                thresholds[pairs % bands])
+            stale = search & seen
+            memo_breach[place[stale]] = found[stale]
+            memo_limit[place[stale]] = limits[stale]
+            new = search & ~seen
+            memo_keys = np.insert(memo_keys, place[new], keys[new])
+            memo_breach = np.insert(memo_breach, place[new], found[new])
+            memo_limit = np.insert(memo_limit, place[new], limits[new])
+
+        breach = found[inverse]
+        hit = breach < end[active]
+        active = active[hit]
+        if len(active) == 0:
+            break
+        asset_growth = window_growth(prefix, row[active], breach[hit] - row[active])
+        held = weights[allocation[active]] * asset_growth
+        held_total = held.sum(axis=1)
+        traded = np.abs(weights[allocation[active]] - held / held_total[:, None]).sum(axis=1)
+        value[active] *= held_total * (1 - cost * traded)
+        turnover[active] += traded / 2
+        rebalances[active] += 1
+        row[active] = breach[hit]
+        active = active[end[active] - row[active] > 1]
+
+    instrument.count("rebalance_events", int(rebalances.sum()))
+    instrument.count("rows_simulated", int(lengths.sum()) * allocations * bands)
+    value *= (weights[allocation] * window_growth(prefix, row, end - row)).sum(axis=1)
+    return value.reshape(shape), rebalances.reshape(shape), turnover.reshape(shape)
@@ -0,0 +1,137 @@
+'''
+streaming sinks for rolling-period results: rows are written as chunks are produced
+
+every sink takes the result column names up front and then write(labels, values) calls, where labels is
+a lst of period labels and values a (rows x columns) array. open_sink picks a sink from the file extension.
+'''
+import csv
+
+import numpy as np
+
+from returns_engine import instrument
+
+
+class CsvSink(object):
+    '''
+    csv with a header row [label_column, *columns], same layout as the csv.writer output of the scripts
+    '''
+
+    def __init__(self, path, columns, label_column="date"):
+        self.path = path
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([label_column] + list(columns))
+
+    def write(self, labels, values):
+        with instrument.stage("output_write"):
+            self.writer.writerows([label] + row for label, row in zip(labels, np.asarray(values).tolist()))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ArrowSink(object):
+    '''
+    parquet (.parquet) or arrow ipc file (.arrow, .feather), one record batch per write
+    needs pyarrow, which is only imported when an ArrowSink is created
+    '''
+
+    def __init__(self, path, columns, label_column="date"):
+        try:
+            import pyarrow
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("writing {} needs pyarrow (pip install pyarrow), or use a .csv or .npy output"
+                .format(path))
+        self.pa = pyarrow
+        self.path = path
+        self.names = [label_column] + list(columns)
+        self.schema = pyarrow.schema([(label_column, pyarrow.string())] +
+            [(name, pyarrow.float64()) for name in columns])
+        if path.endswith(".parquet"):
+            self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pyarrow.ipc.new_file(path, self.schema)
+
+    def write(self, labels, values):
+        with instrument.stage("output_write"):
+            values = np.asarray(values, dtype=np.float64)
+            arrays = [self.pa.array(labels, type=self.pa.string())]
+            arrays.extend(self.pa.array(values[:, column]) for column in range(values.shape[1]))
+            batch = self.pa.record_batch(arrays, schema=self.schema)
+            if hasattr(self.writer, "write_batch"):
+                self.writer.write_batch(batch)
+            else:
+                self.writer.write_table(self.pa.Table.from_batches([batch]))
+
+    def close(self):
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class NpySink(object):
+    '''
+    float64 .npy matrix (rows x columns) loadable with np.load(path, mmap_mode="r"), with the period labels
+    one per line in path + ".labels"
+
+    rows are appended raw after a fixed size header, which is rewritten with the final row count on close
+    '''
+
+    HEADER_SIZE = 128
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = list(columns)
+        self.rows = 0
+        self.file = open(path, "wb")
+        self.file.write(self._header())
+        self.labels = open(path + ".labels", "w")
+
+    def _header(self):
+        header = "{{'descr': '<f8', 'fortran_order': False, 'shape': ({}, {}), }}".format(self.rows, len(self.columns))
+        #magic, version 1.0, header length, then the dict padded with spaces and ending in a newline
+        padding = self.HEADER_SIZE - 10 - len(header) - 1
+        return b"\x93NUMPY\x01\x00" + np.uint16(self.HEADER_SIZE - 10).tobytes() + \
+            (header + " " * padding + "\n").encode("latin1")
+
+    def write(self, labels, values):
+        with instrument.stage("output_write"):
+            values = np.ascontiguousarray(values, dtype="<f8").reshape(len(labels), len(self.columns))
+            self.file.write(values.tobytes())
+            self.labels.writelines(label + "\n" for label in labels)
+            self.rows += len(labels)
+
+    def close(self):
+        self.file.seek(0)
+        self.file.write(self._header())
+        self.file.close()
+        self.labels.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_sink(path, columns, label_column="date"):
+    '''
+    returns CsvSink, ArrowSink or NpySink for path, chosen by its extension (csv if not recognized)
+    '''
+    if path.endswith((".parquet", ".arrow", ".feather")):
+        return ArrowSink(path, columns, label_column)
+    if path.endswith(".npy"):
+        return NpySink(path, columns)
+    return CsvSink(path, columns, label_column)
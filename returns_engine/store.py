@@ -0,0 +1,217 @@
+'''
+columnar storage for the Bloomberg return exports used by rebalance.py and growth_value.py
+'''
+import csv
+import mmap
+import os
+
+import numpy as np
+
+from returns_engine import instrument
+from returns_engine.cache import default_cache
+from returns_engine.dates import DateIndex
+from returns_engine.rolling import log_growth_prefix
+
+
+class ReturnStore(object):
+    '''
+    parsed return data for a single csv file
+    attributes: filename, dates (ordered lst of str, m/d/yyyy), calendar (DateIndex over dates),
+        date_index (dict, {date: row}),
+        returns (float64 array, dates x assets, monthly returns in percent),
+        growth (float64 array, same shape, 1 + return), columns (lst of asset names from the header)
+    '''
+
+    def __init__(self, filename, dates, returns, columns=None, growth=None):
+        self.filename = filename
+        self.dates = dates
+        self.calendar = DateIndex(dates)
+        self.date_index = self.calendar.rows
+        self.returns = returns
+        self.growth = returns / 100 + 1 if growth is None else growth
+        self.columns = columns
+        self._log_prefix = None
+
+    def __len__(self):
+        return len(self.dates)
+
+    def row(self, date):
+        '''
+        input date (str, m/d/yyyy), returns row of that date in the return matrix
+        '''
+        return self.date_index[date]
+
+    def log_prefix(self):
+        '''
+        returns prefix sums of log growth (see rolling.log_growth_prefix), computed once per store
+        '''
+        if self._log_prefix is None:
+            self._log_prefix = log_growth_prefix(self.growth)
+        return self._log_prefix
+
+    def as_dict(self):
+        '''
+        returns dict of form {date: [asset returns]}
+        '''
+        return dict(zip(self.dates, self.returns.tolist()))
+
+
+def select_columns(header, asset_columns, width):
+    '''
+    input: header (lst of str, header names after the date column, or None if the file has no header),
+        asset_columns (None for every named column, int for the first n columns, or lst of header names),
+        width (int, number of values after the date in the first data row)
+    returns (column indexes relative to the first return column, column names)
+    '''
+    if header is not None:
+        #trailing unnamed columns are padding, not assets
+        while header and header[-1] == '':
+            header = header[:-1]
+    names = header if header is not None else ["column {}".format(index + 2) for index in range(width)]
+
+    if asset_columns is None:
+        indexes = list(range(len(names)))
+    elif isinstance(asset_columns, int):
+        indexes = list(range(asset_columns))
+    else:
+        missing = [name for name in asset_columns if name not in names]
+        if missing:
+            raise ValueError("columns {} not found in header {}".format(missing, names))
+        indexes = [names.index(name) for name in asset_columns]
+
+    names = [names[index] if index < len(names) else "column {}".format(index + 2) for index in indexes]
+    return indexes, names
+
+
+def _count_lines(mm, block_size):
+    lines = 1
+    for start in range(0, len(mm), block_size):
+        lines += mm[start:start + block_size].count(b"\n")
+    return lines
+
+
+def _iter_line_blocks(mm, block_size):
+    '''
+    yields lists of decoded lines, about block_size bytes at a time, cut on line boundaries
+    '''
+    start = 0
+    while start < len(mm):
+        end = mm.find(b"\n", min(start + block_size, len(mm)) - 1)
+        end = len(mm) if end == -1 else end + 1
+        yield mm[start:end].decode().splitlines()
+        start = end
+
+
+def read_return_csv(filename, asset_columns=None, dtype=np.float64, block_size=4 * 1024 * 1024):
+    '''
+    input: filename (str), asset_columns (which columns after the date are assets: None for every column
+        named in the header, int for the first n, or lst of header names), dtype (float type of the
+        return matrix), block_size (int, bytes parsed at a time)
+    reads the csv once, skipping header and blank rows, and returns a ReturnStore
+
+    the file is memory mapped and parsed a block of lines at a time straight into preallocated return
+    and growth matrices, so peak memory stays close to the size of the arrays rather than of the
+    parsed text
+    '''
+    dates = []
+    header = None
+    indexes = None
+    returns = growth = None
+    count = 0
+    with instrument.stage("csv_parse"), open(filename, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        try:
+            #one row per line at most, header and blank lines leave a few unused rows at the end
+            capacity = _count_lines(mm, block_size) if size else 0
+            for lines in _iter_line_blocks(mm, block_size):
+                data_lines = []
+                for line in lines:
+                    #only the date and header cells are needed here, numbers are parsed a block at a time
+                    row = line.split(',', 2) if '"' not in line else next(csv.reader([line]), [])
+                    if len(row) < 2 or row[1].isalpha() or row[1] == '':
+                        #first header row names the asset columns
+                        if header is None and len(row) > 1 and row[1].isalpha():
+                            header = next(csv.reader([line]))[2:]
+                        continue
+                    if indexes is None:
+                        indexes, columns = select_columns(header, asset_columns, len(next(csv.reader([line]))) - 2)
+                        returns = np.empty((capacity, len(indexes)), dtype=dtype)
+                        growth = np.empty_like(returns)
+                    dates.append(row[1])
+                    data_lines.append(line)
+                if not data_lines:
+                    continue
+
+                block = returns[count:count + len(data_lines)]
+                try:
+                    block[...] = np.loadtxt(data_lines, delimiter=',', quotechar='"', dtype=dtype, ndmin=2,
+                        usecols=[index + 2 for index in indexes])
+                except ValueError:
+                    #blank cells show up where an index has no history yet, which loadtxt rejects
+                    block[...] = [[float(row[index + 2]) if row[index + 2] != '' else np.nan for index in indexes]
+                        for row in csv.reader(data_lines)]
+                np.divide(block, 100, out=growth[count:count + len(data_lines)])
+                growth[count:count + len(data_lines)] += 1
+                count += len(data_lines)
+        finally:
+            if size:
+                mm.close()
+
+    if indexes is None:
+        indexes, columns = select_columns(header, asset_columns, 0)
+        returns = np.empty((0, len(indexes)), dtype=dtype)
+        growth = np.empty_like(returns)
+    return ReturnStore(filename, dates, returns[:count], columns, growth[:count])
+
+
+#loaded stores, form {(path, asset_columns): ((size, mtime), ReturnStore)}
+_loaded = {}
+
+
+def load_return_store(filename, asset_columns=None, disk_cache=True):
+    '''
+    input: filename (str), asset_columns (see read_return_csv), disk_cache (True for the cache configured
+        in the environment, a ReturnCache, or False to always parse the csv)
+    returns the ReturnStore for the file, parsing it only the first time it is requested
+    (or again if the file changed on disk since). parsed files are also kept in the on-disk cache,
+    so later processes map the arrays instead of parsing.
+    '''
+    stat = os.stat(filename)
+    column_key = asset_columns if asset_columns is None or isinstance(asset_columns, int) else tuple(asset_columns)
+    key = (os.path.abspath(filename), column_key)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+
+    cached = _loaded.get(key)
+    if cached is not None and cached[0] == stamp:
+        instrument.count("store_cache_hits")
+        return cached[1]
+    instrument.count("store_cache_misses")
+
+    if disk_cache is True:
+        disk_cache = default_cache()
+
+    store = None
+    if disk_cache:
+        try:
+            entry = disk_cache.load(filename, column_key, stat)
+        except OSError:
+            entry = None
+        if entry is not None:
+            instrument.count("disk_cache_hits")
+            dates, returns, growth, columns = entry
+            store = ReturnStore(filename, dates, returns, columns, growth)
+        else:
+            instrument.count("disk_cache_misses")
+
+    if store is None:
+        store = read_return_csv(filename, asset_columns)
+        if disk_cache:
+            try:
+                disk_cache.save(store, column_key, stat)
+            except OSError:
+                #an unwritable cache directory only costs the speedup
+                pass
+
+    _loaded[key] = (stamp, store)
+    return store
@@ -0,0 +1,163 @@
+'''
+one-pass summary statistics over rolling-period results, built chunk by chunk as windows are computed
+
+RollingSummary keeps, for each series (portfolio or index column), the count, mean and sum of squared
+deviations (merged per chunk with the parallel form of Welford's update), min and max, a t-digest for
+quantiles, and how many windows each series had the highest value in. memory does not grow with the number
+of windows, so the per-window tables never need to be kept or reloaded to get the notebooks' statistics.
+'''
+import numpy as np
+
+
+class QuantileDigest(object):
+    '''
+    merging t-digest of one series: sorted centroids (means, weights), at most about compression of them,
+    small near both tails so extreme quantiles stay accurate. up to exact_size values are kept as they are,
+    so short histories (a few hundred monthly periods) get exact quantiles.
+    attributes: compression (int), exact_size (int), means, weights (float arrays, ordered by mean)
+    '''
+
+    def __init__(self, compression=200, exact_size=2000):
+        self.compression = compression
+        self.exact_size = exact_size
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+
+    def update(self, values):
+        '''
+        input values (float array, nan already removed), merges them into the centroids
+        '''
+        if len(values) == 0:
+            return
+        means = np.concatenate([self.means, values])
+        weights = np.concatenate([self.weights, np.ones(len(values))])
+        order = np.argsort(means, kind="stable")
+        means = means[order]
+        weights = weights[order]
+        if len(means) <= self.exact_size and np.all(self.weights == 1):
+            #still every value as it is, merging starts once there are more than exact_size
+            self.means = means
+            self.weights = weights
+            return
+
+        #k1 scale function: centroids may span one unit of k, which is narrow near q = 0 and q = 1
+        total = weights.sum()
+        upper = np.cumsum(weights)
+        middle = (upper - weights / 2) / total
+        k = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * middle - 1))
+        starts = np.flatnonzero(np.diff(k, prepend=k[0] - 1))
+
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def quantile(self, q, minimum, maximum):
+        '''
+        input: q (float or array, 0 to 1), minimum, maximum (exact extremes of the series)
+        returns estimated quantile(s), interpolated between centroid centres
+        '''
+        if len(self.means) == 0:
+            return np.full(np.shape(q), np.nan)
+        if len(self.means) <= self.exact_size and np.all(self.weights == 1):
+            #nothing merged yet, same linear interpolation as numpy and pandas
+            return np.quantile(self.means, q)
+        total = self.weights.sum()
+        #centroid i covers ranks upper[i] - weights[i] .. upper[i]; its mean sits at the middle rank
+        centres = (np.cumsum(self.weights) - self.weights / 2) / total
+        return np.interp(q, np.concatenate([[0.0], centres, [1.0]]),
+            np.concatenate([[minimum], self.means, [maximum]]))
+
+
+class RollingSummary(object):
+    '''
+    summary of rolling-period values for several series at once
+    attributes: names (lst of str, one per series), scale (values are multiplied by this before being
+        summarized, e.g. 100 / start value for percent of the starting value), quantiles (tuple of float),
+        count (int array, non-missing windows per series), windows (int, windows seen), mean, minimum, maximum
+        (float arrays), wins (int array, windows in which each series had the highest value)
+    '''
+
+    def __init__(self, names, scale=1.0, quantiles=(0.25, 0.5, 0.75), compression=200):
+        self.names = list(names)
+        self.scale = scale
+        self.quantiles = tuple(quantiles)
+        series = len(self.names)
+        self.windows = 0
+        self.count = np.zeros(series, dtype=np.int64)
+        self.mean = np.zeros(series)
+        self._squares = np.zeros(series)
+        self.minimum = np.full(series, np.inf)
+        self.maximum = np.full(series, -np.inf)
+        self.wins = np.zeros(series, dtype=np.int64)
+        self._digests = [QuantileDigest(compression) for name in self.names]
+
+    def update(self, values):
+        '''
+        input values (array, windows x series, nan where a window has no value for a series)
+        adds a chunk of windows to the summary
+        '''
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(self.names)) * self.scale
+        if len(values) == 0:
+            return
+        self.windows += len(values)
+        present = ~np.isnan(values)
+        count = present.sum(axis=0)
+        filled = np.where(present, values, 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = filled.sum(axis=0) / count
+            squares = (np.where(present, values - mean, 0.0) ** 2).sum(axis=0)
+
+            #combine chunk and running statistics (Chan et al. parallel variance)
+            total = self.count + count
+            delta = mean - self.mean
+            has = count > 0
+            self.mean[has] += (delta * count / total)[has]
+            self._squares[has] += (squares + delta ** 2 * self.count * count / total)[has]
+        self.count = total
+        self.minimum = np.fmin(self.minimum, np.where(present, values, np.inf).min(axis=0))
+        self.maximum = np.fmax(self.maximum, np.where(present, values, -np.inf).max(axis=0))
+
+        #best series in each window that has any value
+        ranked = present.any(axis=1)
+        best = np.argmax(np.where(present, values, -np.inf)[ranked], axis=1)
+        self.wins += np.bincount(best, minlength=len(self.names))
+
+        for series, digest in enumerate(self._digests):
+            digest.update(values[present[:, series], series])
+
+    def std(self, ddof=1):
+        '''
+        returns standard deviation of each series (sample standard deviation by default, as pandas)
+        '''
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.sqrt(np.where(self.count > ddof, self._squares / (self.count - ddof), np.nan))
+
+    def quantile(self, q):
+        '''
+        input q (float, 0 to 1), returns estimated q quantile of each series (float array)
+        '''
+        return np.array([digest.quantile(q, low, high) if count else np.nan for digest, low, high, count in
+            zip(self._digests, self.minimum, self.maximum, self.count)])
+
+    def win_share(self):
+        '''
+        returns share of windows in which each series was the best (float array), replacing the notebook's
+        count / 244
+        '''
+        return self.wins / self.windows if self.windows else np.zeros(len(self.names))
+
+    def as_dict(self):
+        '''
+        returns dict of form {series name: {"mean": .., "std": .., "min": .., "25th": .., "median": ..,
+            "75th": .., "max": .., "best share": .., "windows": ..}}
+        '''
+        columns = [("mean", self.mean), ("std", self.std()), ("min", self.minimum)]
+        for q in self.quantiles:
+            label = "median" if q == 0.5 else "{:g}th".format(q * 100)
+            columns.append((label, self.quantile(q)))
+        columns += [("max", self.maximum), ("best share", self.win_share()), ("windows", self.count)]
+
+        summary = {}
+        for series, name in enumerate(self.names):
+            summary[name] = {label: (values[series].item() if self.count[series] or label in ("best share",
+                "windows") else float("nan")) for label, values in columns}
+        return summary
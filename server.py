@@ -0,0 +1,359 @@
+'''
+asyncio http/json service over rebalance.py and growth_value.py, so new periods and allocations can be
+queried without starting the scripts each time
+
+usage: python server.py --rebalance-file rebalance.csv --growth-value-file growth_value_return_data.csv
+    [--host 127.0.0.1] [--port 8080] [--workers n] [--cache-size 256]
+
+endpoints (POST with a json body; every field is optional except start/end):
+    /rebalance/period      {"start": "1/1/1979", "end": "12/31/2004", "start_value": 10,
+                            "risk_levels": [["low risk", 0.3, 0.65, 0.05], ...]}
+    /rebalance/rolling     {"length": 25, "start_value": 10, "step": null, "risk_levels": [...], "summary": false}
+    /growth_value/period   {"start": "1/1/2000", "end": "12/31/2004", "start_value": 10}
+    /growth_value/rolling  {"lengths": [5, 10, 20], "start_value": 10, "step": null, "summary": false}
+    GET /health            loaded files and cache counts
+
+the return files are parsed once at startup and stay resident. period queries are answered in the event
+loop; rolling sweeps run on a process pool whose workers load the same files once. identical requests
+that arrive while one is being computed share its result, and answers are kept in an lru cache keyed
+by the request and the file's size and mtime, so repeat queries are served straight from memory.
+'''
+import argparse
+import asyncio
+import collections
+import json
+import os
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import growth_value
+import rebalance
+from returns_engine import FREQUENCIES, RollingSummary, default_workers, load_return_store
+
+
+class RequestError(Exception):
+    '''
+    bad request parameters, answered with status 400
+    '''
+
+
+def _preload(files):
+    '''
+    pool initializer: parse the return files once per worker
+    '''
+    for filename, asset_columns in files:
+        load_return_store(filename, asset_columns)
+
+
+def _clean(values):
+    #json has no nan, missing values are sent as null
+    values = np.asarray(values, dtype=np.float64)
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def _table(columns, periods, values, summary, start_value):
+    result = {"columns": columns, "periods": periods, "values": _clean(values)}
+    if summary:
+        rolling_summary = RollingSummary(columns, 100 / start_value)
+        rolling_summary.update(np.asarray(values, dtype=np.float64).reshape(-1, len(columns)))
+        result["summary"] = rolling_summary.as_dict()
+    return result
+
+
+def rebalance_period(filename, params):
+    data = rebalance.ReturnData(filename)
+    period, values = rebalance.period_value_comparison(params["start_value"], (params["start"], params["end"]),
+        data, params["risk_levels"])
+    return {"period": period, "values": dict(zip(rebalance.portfolio_names(params["risk_levels"]), _clean(values)))}
+
+
+def rebalance_rolling(filename, params):
+    d = rebalance.rolling_pd_comparison(params["start_value"], filename, params["length"], step=params["step"],
+        risk_levels=params["risk_levels"])
+    return _table(rebalance.portfolio_names(params["risk_levels"]), list(d), list(d.values()), params["summary"],
+        params["start_value"])
+
+
+def growth_value_period(filename, params):
+    data = growth_value.ReturnData(filename)
+    row = growth_value.period_value_comparison(params["start_value"], (params["start"], params["end"]), data)
+    return {"period": row[0], "values": dict(zip(data.get_columns(), _clean(row[1:])))}
+
+
+def growth_value_rolling(filename, params):
+    tables = growth_value.rolling_pd_comparison(params["start_value"], filename, params["lengths"],
+        step=params["step"])
+    return {"lengths": {str(length): _table(table[0][1:], [row[0] for row in table[1:]],
+        [row[1:] for row in table[1:]], params["summary"], params["start_value"])
+        for length, table in zip(params["lengths"], tables)}}
+
+
+def _number(params, name, default, kind=float):
+    value = params.get(name, default)
+    invalid = RequestError("{} must be a {}number, got {!r}".format(name, "whole " if kind is int else "", value))
+    #int() would truncate 5.5 to 5 and take true as 1, so those are rejected before converting
+    if isinstance(value, bool) or (kind is int and isinstance(value, float) and not value.is_integer()):
+        raise invalid
+    try:
+        value = kind(value)
+    except (TypeError, ValueError):
+        raise invalid
+    if value <= 0:
+        raise RequestError("{} must be positive, got {}".format(name, value))
+    return value
+
+
+def _step(params):
+    step = params.get("step")
+    if step is not None and step not in FREQUENCIES:
+        raise RequestError("step must be one of {} or null, got {!r}".format(", ".join(FREQUENCIES), step))
+    return step
+
+
+def _period(params):
+    for name in ("start", "end"):
+        if not isinstance(params.get(name), str):
+            raise RequestError("{} date (m/d/yyyy) is required".format(name))
+    return {"start": params["start"], "end": params["end"], "start_value": _number(params, "start_value", 10)}
+
+
+def _risk_levels(params):
+    levels = params.get("risk_levels")
+    if levels is None:
+        return rebalance.RISK_LEVELS
+    try:
+        return [(str(name), float(equities), float(bonds), float(cash)) for name, equities, bonds, cash in levels]
+    except (TypeError, ValueError):
+        raise RequestError("risk_levels must be a list of [name, equities, bonds, cash]")
+
+
+def _lengths(params):
+    lengths = params.get("lengths", [5, 10, 20])
+    if not isinstance(lengths, list) or not lengths:
+        raise RequestError("lengths must be a list of years")
+    return [_number({"length": length}, "length", None, int) for length in lengths]
+
+
+#route: (function, which data file, parameter parser, runs on the process pool)
+ROUTES = {
+    "/rebalance/period": (rebalance_period, "rebalance",
+        lambda params: dict(_period(params), risk_levels=_risk_levels(params)), False),
+    "/rebalance/rolling": (rebalance_rolling, "rebalance",
+        lambda params: {"length": _number(params, "length", 25, int), "start_value": _number(params, "start_value", 10),
+            "step": _step(params), "risk_levels": _risk_levels(params), "summary": bool(params.get("summary"))},
+        True),
+    "/growth_value/period": (growth_value_period, "growth_value", _period, False),
+    "/growth_value/rolling": (growth_value_rolling, "growth_value",
+        lambda params: {"lengths": _lengths(params), "start_value": _number(params, "start_value", 10),
+            "step": _step(params), "summary": bool(params.get("summary"))},
+        True),
+}
+
+
+class ResultCache(object):
+    '''
+    lru cache of encoded responses
+    attributes: max_entries (int), hits, misses (int)
+    '''
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        body = self._entries.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return body
+
+    def put(self, key, body):
+        self._entries[key] = body
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class ComparisonService(object):
+    '''
+    attributes: files (dict, {"rebalance" or "growth_value": filename}), pool (ProcessPoolExecutor for
+        rolling sweeps), cache (ResultCache), in_flight (dict, {request key: asyncio task}), shared (int,
+        requests answered by another request's computation)
+    '''
+
+    def __init__(self, files, workers=None, cache_size=256):
+        self.files = files
+        self.cache = ResultCache(cache_size)
+        self.in_flight = {}
+        self.shared = 0
+
+        #parse once here for the period queries, and once per pool worker for the sweeps
+        columns = {"rebalance": rebalance.ReturnData.asset_columns,
+            "growth_value": growth_value.ReturnData.asset_columns}
+        preload = [(filename, columns[name]) for name, filename in files.items()]
+        _preload(preload)
+        self.pool = ProcessPoolExecutor(max_workers=workers or default_workers(), initializer=_preload,
+            initargs=(preload,))
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    def health(self):
+        return {"status": "ok", "files": self.files, "cached": len(self.cache), "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses, "in_flight": len(self.in_flight), "shared": self.shared}
+
+    async def query(self, route, params):
+        '''
+        input: route (str, one of ROUTES), params (dict, json request body)
+        returns encoded json response body (bytes); raises RequestError for bad parameters
+        '''
+        if route not in ROUTES:
+            raise KeyError(route)
+        fn, data_name, parse, pooled = ROUTES[route]
+        filename = self.files.get(data_name)
+        if filename is None:
+            raise RequestError("server was started without a {} file".format(data_name))
+        params = parse(params)
+
+        stat = os.stat(filename)
+        key = (route, json.dumps(params, sort_keys=True), stat.st_size, stat.st_mtime_ns)
+        body = self.cache.get(key)
+        if body is not None:
+            return body
+
+        task = self.in_flight.get(key)
+        if task is not None:
+            self.shared += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(self._compute(key, fn, filename, params, pooled))
+        self.in_flight[key] = task
+        return await asyncio.shield(task)
+
+    async def _compute(self, key, fn, filename, params, pooled):
+        try:
+            if pooled:
+                result = await asyncio.get_running_loop().run_in_executor(self.pool, fn, filename, params)
+            else:
+                result = fn(filename, params)
+            body = json.dumps(result).encode()
+            self.cache.put(key, body)
+            return body
+        finally:
+            self.in_flight.pop(key, None)
+
+
+STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+async def _respond(writer, status, body, keep_alive):
+    writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: {}\r\n\r\n"
+        .format(status, STATUS[status], len(body), "keep-alive" if keep_alive else "close").encode() + body)
+    await writer.drain()
+
+
+def _error(message):
+    return json.dumps({"error": message}).encode()
+
+
+async def handle_connection(service, reader, writer):
+    '''
+    serves http/1.1 requests on one connection until the client closes it or asks to
+    '''
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            try:
+                method, target, version = request_line.decode("latin-1").split()
+            except ValueError:
+                await _respond(writer, 400, _error("malformed request line"), False)
+                break
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, sep, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+            keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+
+            route = target.split("?", 1)[0]
+            if route == "/health":
+                status, response = 200, json.dumps(service.health()).encode()
+            elif route not in ROUTES:
+                status, response = 404, _error("unknown route {}, expected one of {}".format(route,
+                    ", ".join(sorted(ROUTES))))
+            elif method != "POST":
+                status, response = 405, _error("use POST with a json body")
+            else:
+                try:
+                    params = json.loads(body or b"{}")
+                    if not isinstance(params, dict):
+                        raise RequestError("request body must be a json object")
+                    status, response = 200, await service.query(route, params)
+                except (RequestError, ValueError, KeyError) as e:
+                    #ValueError covers bad json and KeyError dates missing from the file
+                    status, response = 400, _error("{}: {}".format(type(e).__name__, e))
+                except Exception as e:
+                    traceback.print_exc()
+                    status, response = 500, _error("{}: {}".format(type(e).__name__, e))
+
+            await _respond(writer, status, response, keep_alive)
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, host="127.0.0.1", port=8080):
+    server = await asyncio.start_server(lambda reader, writer: handle_connection(service, reader, writer), host, port)
+    print("serving on http://{}:{}".format(host, server.sockets[0].getsockname()[1]), flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rebalance-file", help="return csv for the /rebalance routes")
+    parser.add_argument("--growth-value-file", help="return csv for the /growth_value routes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=None, help="processes for rolling sweeps (default all cpus)")
+    parser.add_argument("--cache-size", type=int, default=256, help="responses kept in the result cache")
+    args = parser.parse_args()
+
+    files = {}
+    if args.rebalance_file:
+        files["rebalance"] = os.path.abspath(args.rebalance_file)
+    if args.growth_value_file:
+        files["growth_value"] = os.path.abspath(args.growth_value_file)
+    if not files:
+        parser.error("give --rebalance-file and/or --growth-value-file")
+
+    service = ComparisonService(files, args.workers, args.cache_size)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
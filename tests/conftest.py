@@ -0,0 +1,57 @@
+'''
+small synthetic return stores shared by the tests, built in memory so no csv or cache is touched
+'''
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from returns_engine import ReturnStore
+
+
+def weekdays(start, stop):
+    '''
+    returns datetime64[D] array of the weekdays from start up to stop (str, yyyy-mm-dd)
+    '''
+    days = np.arange(np.datetime64(start), np.datetime64(stop))
+    #1970-01-01 was a thursday, so (days + 3) % 7 is 0 on mondays
+    return days[(days.astype(np.int64) + 3) % 7 < 5]
+
+
+def format_dates(days):
+    '''
+    returns lst of m/d/yyyy strings for a datetime64[D] array
+    '''
+    months = days.astype("datetime64[M]")
+    return ["{}/{}/{}".format(month % 12 + 1, day + 1, month // 12 + 1970) for month, day in
+        zip(months.astype(np.int64).tolist(), (days - months.astype("datetime64[D]")).astype(np.int64).tolist())]
+
+
+def synthetic_store(days, assets, scale, seed=0):
+    '''
+    returns ReturnStore of random percent returns (sd scale) on the given days
+    '''
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(scale / 10, scale, size=(len(days), assets))
+    return ReturnStore("synthetic", format_dates(days), returns, ["A{}".format(i) for i in range(assets)])
+
+
+@pytest.fixture(scope="session")
+def monthly_store():
+    '''
+    20 years of month end rows, 4 assets
+    '''
+    days = weekdays("2000-01-01", "2020-01-01")
+    months = days.astype("datetime64[M]")
+    return synthetic_store(days[np.append(months[1:] != months[:-1], True)], 4, 4.0)
+
+
+@pytest.fixture(scope="session")
+def daily_store():
+    '''
+    6 years of business day rows, 3 assets
+    '''
+    return synthetic_store(weekdays("2000-01-03", "2006-01-01"), 3, 1.0, seed=1)
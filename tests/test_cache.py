@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+
+from returns_engine import ReturnCache, instrument, load_return_store, read_return_csv
+
+
+def write_export(path, rows, swapped=False):
+    lines = [",Date,A,B", ",,,"]
+    for row in range(rows):
+        cells = ["{:.4f}".format(row % 7 - 3), "{:.4f}".format(row % 5 - 2)]
+        if swapped:
+            cells.reverse()
+        lines.append(",{}/28/{},{}".format(row % 12 + 1, 2000 + row // 12, ",".join(cells)))
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def disk_counts(filename, cache):
+    '''
+    loads filename through load_return_store, returns (store, disk cache hits, misses)
+    '''
+    instrument.reset()
+    with instrument.capture():
+        store = load_return_store(filename, None, cache)
+        counters = instrument.report()["counters"]
+    return store, counters.get("disk_cache_hits", 0), counters.get("disk_cache_misses", 0)
+
+
+def set_mtime(path, seconds):
+    os.utime(path, (seconds, seconds))
+
+
+def test_hit_and_stale_entries(tmp_path):
+    cache = ReturnCache(str(tmp_path / "cache"))
+    filename = write_export(tmp_path / "r.csv", 60)
+    store, hits, misses = disk_counts(filename, cache)
+    assert (hits, misses) == (0, 1)
+    np.testing.assert_array_equal(store.returns, read_return_csv(filename).returns)
+
+    #a new process (or a changed mtime) reads the entry instead of parsing
+    set_mtime(filename, 1000000000)
+    store, hits, misses = disk_counts(filename, cache)
+    assert (hits, misses) == (1, 0)
+    assert isinstance(store.returns, np.memmap)
+
+    #more rows: the size differs
+    write_export(tmp_path / "r.csv", 61)
+    store, hits, misses = disk_counts(filename, cache)
+    assert (hits, misses) == (0, 1)
+    assert len(store) == 61
+
+    #same size, different contents, and a later mtime: only the sha256 tells them apart
+    size = os.path.getsize(filename)
+    write_export(tmp_path / "r.csv", 61, swapped=True)
+    assert os.path.getsize(filename) == size
+    set_mtime(filename, 1100000000)
+    store, hits, misses = disk_counts(filename, cache)
+    assert (hits, misses) == (0, 1)
+    np.testing.assert_array_equal(store.returns, read_return_csv(filename).returns)
+
+
+def test_touch_keeps_entry(tmp_path):
+    cache = ReturnCache(str(tmp_path / "cache"))
+    filename = write_export(tmp_path / "r.csv", 60)
+    disk_counts(filename, cache)
+    key = cache.entry_key(filename, None)
+
+    set_mtime(filename, 1200000000)
+    store, hits, misses = disk_counts(filename, cache)
+    assert (hits, misses) == (1, 0)
+    #the entry takes the new mtime, so the next load skips hashing the file
+    assert cache._read_meta(key)["mtime_ns"] == os.stat(filename).st_mtime_ns
+    assert cache.load(filename, None) is not None
+
+
+def test_least_recently_used_evicted(tmp_path):
+    filenames = [write_export(tmp_path / "{}.csv".format(name), 60) for name in "abc"]
+    cache = ReturnCache(str(tmp_path / "cache"))
+    cache.save(read_return_csv(filenames[0]), None)
+    entry_bytes = cache.entries()[0][1]
+    cache.max_bytes = 2 * entry_bytes
+    cache.save(read_return_csv(filenames[1]), None)
+    keys = [cache.entry_key(filename, None) for filename in filenames]
+
+    #a was saved first but used last, so b is the least recently used once c arrives
+    set_mtime(cache._path(keys[0], "meta"), 1000)
+    set_mtime(cache._path(keys[1], "meta"), 2000)
+    assert cache.load(filenames[0], None) is not None
+    cache.save(read_return_csv(filenames[2]), None)
+
+    assert sorted(key for used, size, key in cache.entries()) == sorted([keys[0], keys[2]])
+    assert cache.load(filenames[1], None) is None
+    assert cache.load(filenames[0], None) is not None
+    assert sum(size for used, size, key in cache.entries()) <= cache.max_bytes
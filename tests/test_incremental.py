@@ -0,0 +1,34 @@
+import numpy as np
+
+from returns_engine import ReturnStore, end_values_chunk, incremental_windows, rebalanced_chunk
+
+
+def truncated(store, rows):
+    return ReturnStore(store.filename, store.dates[:rows], store.returns[:rows], store.columns)
+
+
+def test_append_matches_full_recompute(monthly_store, tmp_path):
+    weights = np.array([[.4, .3, .2, .1], [.25, .25, .25, .25]])
+    for fn, args in ((end_values_chunk, (10.0,)), (rebalanced_chunk, (weights, ["none", "monthly", "annual"], 10.0))):
+        state = str(tmp_path / (fn.__name__ + ".npz"))
+        incremental_windows(state, fn, truncated(monthly_store, 200), [60, 120], args)
+        values, starts, lengths, computed = incremental_windows(state, fn, monthly_store, [60, 120], args)
+        full, full_starts, full_lengths, full_computed = incremental_windows(str(tmp_path / "fresh.npz"), fn,
+            monthly_store, [60, 120], args)
+        (tmp_path / "fresh.npz").unlink()
+
+        #only windows ending in the 40 appended rows are new, 40 for each length
+        assert computed == 80
+        assert full_computed == len(full_starts)
+        np.testing.assert_array_equal(starts, full_starts)
+        np.testing.assert_array_equal(lengths, full_lengths)
+        np.testing.assert_allclose(values, full, rtol=1e-12)
+
+
+def test_changed_rows_recompute(monthly_store, tmp_path):
+    state = str(tmp_path / "state.npz")
+    incremental_windows(state, end_values_chunk, monthly_store, [60], (10.0,))
+    revised = ReturnStore(monthly_store.filename, monthly_store.dates, monthly_store.returns + 0.5,
+        monthly_store.columns)
+    values, starts, lengths, computed = incremental_windows(state, end_values_chunk, revised, [60], (10.0,))
+    assert computed == len(starts)
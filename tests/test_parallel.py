@@ -0,0 +1,57 @@
+import numpy as np
+
+from returns_engine import (ReturnData, calendar_rebalanced_chunk, end_values_chunk, iter_pool_chunks,
+    iter_rolling_rebalanced, iter_rolling_values, map_windows, rebalanced_chunk, threshold_chunk)
+
+
+def test_pool_chunks_are_bounded_and_ordered(monthly_store):
+    pulled = []
+
+    def chunks():
+        for first in range(0, 200, 10):
+            pulled.append(first)
+            yield np.arange(first, first + 10), np.full(10, 24)
+
+    stream = iter_pool_chunks(end_values_chunk, monthly_store.growth, chunks(), (1.0,), workers=2, in_flight=3)
+    (starts, lengths), values = next(stream)
+    #only the tasks in flight have been taken from the chunk iterable
+    assert len(pulled) == 3
+    assert starts[0] == 0
+    firsts = [0] + [int(starts[0]) for (starts, lengths), values in stream]
+    assert firsts == list(range(0, 200, 10))
+
+
+def test_streamed_workers_match_serial(monthly_store, daily_store):
+    weights = np.full((1, 4), .25)
+    data = ReturnData(monthly_store.filename, monthly_store)
+    serial = list(iter_rolling_rebalanced(data, weights, ["none", "annual"], 5, 10.0, 25))
+    pooled = list(iter_rolling_rebalanced(data, weights, ["none", "annual"], 5, 10.0, 25, workers=2))
+    assert [labels for labels, cube in serial] == [labels for labels, cube in pooled]
+    np.testing.assert_array_equal(np.concatenate([cube for labels, cube in serial]),
+        np.concatenate([cube for labels, cube in pooled]))
+
+    data = ReturnData(daily_store.filename, daily_store)
+    serial = list(iter_rolling_values(data, [2], 10.0, 100))
+    pooled = list(iter_rolling_values(data, [2], 10.0, 100, workers=2))
+    assert [labels for length, labels, values in serial] == [labels for length, labels, values in pooled]
+    np.testing.assert_array_equal(np.concatenate([values for length, labels, values in serial]),
+        np.concatenate([values for length, labels, values in pooled]))
+
+
+def test_map_windows_workers_match_serial(monthly_store, daily_store):
+    weights = np.array([[.4, .3, .2, .1], [.25, .25, .25, .25]])
+    starts = np.arange(0, 150, 3)
+    lengths = np.where(starts % 2 == 0, 60, 90)
+    for fn, args in ((end_values_chunk, (10.0,)), (rebalanced_chunk, (weights, ["none", "quarterly", 12], 10.0)),
+            (threshold_chunk, (weights, [0.02, 0.1], 10.0, 0.001))):
+        serial = map_windows(fn, monthly_store.growth, (starts, lengths), args)
+        for chunk_size in (None, 7):
+            np.testing.assert_array_equal(map_windows(fn, monthly_store.growth, (starts, lengths), args, 2,
+                chunk_size), serial)
+
+    calendar = daily_store.calendar
+    starts, lengths = calendar.calendar_windows([1, 2], "weekly")
+    args = (calendar.month_ordinals, np.full((1, 3), 1 / 3), ["none", "monthly"], 1.0)
+    serial = map_windows(calendar_rebalanced_chunk, daily_store.growth, (starts, lengths), args)
+    np.testing.assert_array_equal(map_windows(calendar_rebalanced_chunk, daily_store.growth, (starts, lengths),
+        args, 2), serial)
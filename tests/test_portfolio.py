@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from returns_engine import Portfolio, simulate_rebalanced_calendar
+
+WEIGHTS = [.4, .3, .2, .1]
+
+
+def month_by_month(growth, weights, start_value, rebalance_every):
+    '''
+    reference: holdings stepped one row at a time, rebalanced after every rebalance_every-th row
+    '''
+    holdings = start_value * np.asarray(weights)
+    for month, row in enumerate(growth, 1):
+        holdings = holdings * row
+        if rebalance_every and month % rebalance_every == 0:
+            holdings = holdings.sum() * np.asarray(weights)
+    return [holdings.sum()] + holdings.tolist()
+
+
+@pytest.mark.parametrize("rebalance_every", [0, 1, 3, 12, 25])
+def test_simulate_matches_month_by_month(monthly_store, rebalance_every):
+    portfolio = Portfolio(10, WEIGHTS, monthly_store.filename, monthly_store)
+    for first, months in ((0, 240), (7, 60), (30, 121), (100, 1)):
+        date_range = portfolio.date_range(monthly_store.dates[first], monthly_store.dates[first + months - 1])
+        final = portfolio.simulate(portfolio.starting_portfolio(), date_range, rebalance_every)
+        stepped, values = portfolio.simulate(portfolio.starting_portfolio(), date_range, rebalance_every, path=True)
+        reference = month_by_month(monthly_store.growth[first:first + months], WEIGHTS, 10, rebalance_every)
+        np.testing.assert_allclose(final, reference, rtol=1e-12)
+        np.testing.assert_allclose(stepped, reference, rtol=1e-12)
+        np.testing.assert_allclose(values[-1], reference, rtol=1e-12)
+        assert values.shape == (months + 1, len(WEIGHTS) + 1)
+
+
+@pytest.mark.parametrize("rebalance_every", [0, 1, 3, 12])
+def test_daily_simulate_matches_calendar_kernel(daily_store, rebalance_every):
+    weights = [.5, .3, .2]
+    portfolio = Portfolio(10, weights, daily_store.filename, daily_store)
+    calendar = daily_store.calendar
+    starts, lengths = calendar.calendar_windows([2], "monthly")
+    cube = simulate_rebalanced_calendar(daily_store.growth, weights, [rebalance_every], starts, lengths,
+        calendar.month_ordinals, 10)
+    for window in range(0, len(starts), 5):
+        date_range = portfolio.date_range(daily_store.dates[starts[window]],
+            daily_store.dates[starts[window] + lengths[window] - 1])
+        final = portfolio.simulate(portfolio.starting_portfolio(), date_range, rebalance_every)
+        stepped, values = portfolio.simulate(portfolio.starting_portfolio(), date_range, rebalance_every, path=True)
+        assert final[0] == pytest.approx(cube[window, 0, 0], rel=1e-12)
+        np.testing.assert_allclose(final, stepped, rtol=1e-12)
+
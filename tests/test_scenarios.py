@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from returns_engine import SCENARIO_METHODS, simulate_scenarios
+from returns_engine.scenarios import SEED_BLOCK
+
+WEIGHTS = np.array([[.4, .3, .2, .1], [.25, .25, .25, .25]])
+SCHEDULES = ["none", "monthly", "annual"]
+
+
+@pytest.mark.parametrize("method", SCENARIO_METHODS)
+def test_same_outcomes_for_any_budget_and_workers(monthly_store, method):
+    #more than two seed blocks, the last one partial
+    paths = 2 * SEED_BLOCK + 300
+    reference = simulate_scenarios(monthly_store.growth, WEIGHTS, SCHEDULES, 36, paths, method, seed=7)
+    assert reference.shape == (paths, len(WEIGHTS), len(SCHEDULES))
+    for workers, memory_budget in ((None, 100 * 1024), (2, 100 * 1024), (2, 1 << 30), (3, 4 * 1024 * 1024)):
+        outcomes = simulate_scenarios(monthly_store.growth, WEIGHTS, SCHEDULES, 36, paths, method, seed=7,
+            workers=workers, memory_budget=memory_budget)
+        np.testing.assert_array_equal(outcomes, reference)
+
+
+def test_seed_changes_outcomes(monthly_store):
+    first = simulate_scenarios(monthly_store.growth, WEIGHTS, SCHEDULES, 24, 500, seed=1)
+    second = simulate_scenarios(monthly_store.growth, WEIGHTS, SCHEDULES, 24, 500, seed=2)
+    assert not np.array_equal(first, second)
@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+import server
+
+
+def write_export(path, store, names):
+    lines = [",Date," + ",".join(names), "," * (len(names) + 1)]
+    for date, row in zip(store.dates, store.returns[:, :len(names)].tolist()):
+        lines.append("," + date + "," + ",".join("{:.6f}".format(value) for value in row))
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch, monthly_store):
+    monkeypatch.setenv("RETURNS_ENGINE_CACHE_DIR", "off")
+    store = monthly_store
+    wide = type(store)(store.filename, store.dates, np.hstack([store.returns, store.returns[:, :2] / 2]),
+        ["A", "B", "C", "D", "E", "F"])
+    files = {"rebalance": write_export(tmp_path / "rebalance.csv", wide, ["LC", "SC", "INT", "BOND", "CASH"]),
+        "growth_value": write_export(tmp_path / "growth.csv", wide, ["lcg", "lcv", "mcg", "mcv", "scg", "scv"])}
+    service = server.ComparisonService(files, workers=1)
+    yield service
+    service.close()
+
+
+async def request(port, method, route, body=None):
+    '''
+    returns (status, decoded json body) of one http request to the local server
+    '''
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    payload = b"" if body is None else (body if isinstance(body, bytes) else json.dumps(body).encode())
+    writer.write("{} {} HTTP/1.1\r\nContent-Length: {}\r\nConnection: close\r\n\r\n".format(method, route,
+        len(payload)).encode() + payload)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, sep, value = line.decode().partition(":")
+        headers[name.strip().lower()] = value.strip()
+    response = json.loads(await reader.readexactly(int(headers["content-length"])))
+    writer.close()
+    return status, response
+
+
+def run_requests(service, requests):
+    '''
+    serves on a free port while the given (method, route, body) requests are made one after another
+    '''
+    async def run():
+        listener = await asyncio.start_server(lambda reader, writer: server.handle_connection(service, reader,
+            writer), "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            return [await request(port, *arguments) for arguments in requests]
+    return asyncio.run(run())
+
+
+def test_routes(service):
+    period = {"start": "1/2005", "end": "12/31/2014", "start_value": 10}
+    (status, rebalance_period), (status_growth, growth_period), (status_rolling, rolling), (status_health, health) = \
+        run_requests(service, [("POST", "/rebalance/period", period), ("POST", "/growth_value/period", period),
+            ("POST", "/growth_value/rolling", {"lengths": [5], "summary": True}), ("GET", "/health", None)])
+    assert (status, status_growth, status_rolling, status_health) == (200, 200, 200, 200)
+    assert len(rebalance_period["values"]) == 9
+    assert list(growth_period["values"]) == ["lcg", "lcv", "mcg", "mcv", "scg", "scv"]
+    table = rolling["lengths"]["5"]
+    assert table["columns"] == ["lcg", "lcv", "mcg", "mcv", "scg", "scv"]
+    assert len(table["periods"]) == len(table["values"]) == 240 - 60 + 1
+    assert set(table["summary"]) == set(table["columns"])
+    assert health["status"] == "ok" and health["cache_misses"] == 3
+
+
+@pytest.mark.parametrize("route, body", [
+    ("/rebalance/period", {"end": "12/31/2014"}),
+    ("/rebalance/period", {"start": "1/2005", "end": "12/31/2030"}),
+    ("/rebalance/rolling", {"length": 5.5}),
+    ("/rebalance/rolling", {"length": True}),
+    ("/rebalance/rolling", {"length": -5}),
+    ("/rebalance/rolling", {"step": "hourly"}),
+    ("/rebalance/rolling", {"risk_levels": [["low", "x", 0.5, 0.5]]}),
+    ("/growth_value/rolling", {"lengths": [5, 2.5]}),
+    ("/growth_value/rolling", {"lengths": 5}),
+    ("/growth_value/period", [1, 2]),
+    ("/growth_value/period", b"{not json"),
+])
+def test_bad_requests(service, route, body):
+    [(status, response)] = run_requests(service, [("POST", route, body)])
+    assert status == 400
+    assert "error" in response
+
+
+def test_unknown_route_and_method(service):
+    (missing, response), (wrong_method, response) = run_requests(service, [("POST", "/nowhere", {}),
+        ("GET", "/rebalance/period", None)])
+    assert (missing, wrong_method) == (404, 405)
+
+
+def test_whole_number_floats_accepted(service):
+    assert server._number({"length": 5.0}, "length", None, int) == 5
+    assert server._number({"start_value": 2.5}, "start_value", 10) == 2.5
+
+
+def test_identical_requests_share_one_computation(service):
+    async def run():
+        params = {"length": 5, "start_value": 10}
+        return await asyncio.gather(*[service.query("/rebalance/rolling", params) for _ in range(3)])
+
+    bodies = asyncio.run(run())
+    assert bodies[0] == bodies[1] == bodies[2]
+    assert service.shared == 2
+    assert service.cache.misses == 3 and len(service.cache) == 1
+    assert not service.in_flight
+
+    #answered from the cache afterwards
+    asyncio.run(service.query("/rebalance/rolling", {"length": 5, "start_value": 10}))
+    assert service.cache.hits == 1 and service.shared == 2
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from returns_engine import Portfolio, simulate_threshold
+
+WEIGHTS = np.array([[.4, .3, .2, .1], [.7, .1, .1, .1]])
+THRESHOLDS = [0.01, 0.05, 0.2]
+
+
+@pytest.mark.parametrize("cost", [0.0, 0.002])
+def test_threshold_kernel_matches_stepping(monthly_store, cost):
+    starts = np.arange(0, 180, 7)
+    lengths = np.where(starts % 2 == 0, 60, 37)
+    values, rebalances, turnover = simulate_threshold(monthly_store.growth, WEIGHTS, THRESHOLDS, starts, lengths,
+        10, cost)
+    assert values.shape == (len(starts), len(WEIGHTS), len(THRESHOLDS))
+    #the narrow bands rebalance many times, so breach jumping is exercised
+    assert rebalances[:, :, 0].min() > 1
+
+    for window, (start, length) in enumerate(zip(starts.tolist(), lengths.tolist())):
+        for allocation, weights in enumerate(WEIGHTS):
+            portfolio = Portfolio(10, weights, monthly_store.filename, monthly_store)
+            date_range = portfolio.date_range(monthly_store.dates[start], monthly_store.dates[start + length - 1])
+            for band, threshold in enumerate(THRESHOLDS):
+                final, count, traded = portfolio.simulate_threshold(portfolio.starting_portfolio(), date_range,
+                    threshold, cost)
+                assert values[window, allocation, band] == pytest.approx(final[0], rel=1e-12)
+                assert rebalances[window, allocation, band] == count
+                assert turnover[window, allocation, band] == pytest.approx(traded, rel=1e-9, abs=1e-12)
+
+
+def test_threshold_path_matches_final(monthly_store):
+    portfolio = Portfolio(10, WEIGHTS[0], monthly_store.filename, monthly_store)
+    date_range = portfolio.date_range(monthly_store.dates[12], monthly_store.dates[131])
+    final, count, traded = portfolio.simulate_threshold(portfolio.starting_portfolio(), date_range, 0.05)
+    path_final, path_count, path_traded, values = portfolio.simulate_threshold(portfolio.starting_portfolio(),
+        date_range, 0.05, path=True)
+    assert (path_final, path_count, path_traded) == (final, count, traded)
+    np.testing.assert_allclose(values[-1], final)
+    #a band no drift reaches never rebalances, and matches the unbalanced simulation
+    final, count, traded = portfolio.simulate_threshold(portfolio.starting_portfolio(), date_range, 10.0)
+    assert count == 0
+    np.testing.assert_allclose(final, portfolio.simulate(portfolio.starting_portfolio(), date_range), rtol=1e-12)
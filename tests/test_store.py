@@ -0,0 +1,110 @@
+import csv
+
+import numpy as np
+import pytest
+
+from returns_engine import read_return_csv
+
+
+def reference(path):
+    '''
+    the export read row by row with csv.reader: (header names, dates, returns with nan for blank cells)
+    '''
+    header = None
+    dates = []
+    returns = []
+    with open(path, newline="") as f:
+        for row in csv.reader(f):
+            if len(row) < 2 or row[1] == "" or row[1].isalpha():
+                if header is None and len(row) > 1 and row[1].isalpha():
+                    header = row[2:]
+                continue
+            dates.append(row[1])
+            returns.append([float(cell) if cell != "" else np.nan for cell in row[2:]])
+    return header, dates, np.array(returns, dtype=np.float64).reshape(len(dates), -1)
+
+
+def write_export(path, rows, header=("A", "B", "C"), newline="\n", quote=False):
+    rng = np.random.default_rng(rows)
+    lines = []
+    if header is not None:
+        lines.append(",Date," + ",".join(header))
+        lines.append("," * (len(header) + 1))
+    for row in range(rows):
+        cells = ["{:.4f}".format(value) for value in rng.normal(0, 3, size=len(header or "ABC"))]
+        date = "{}/28/{}".format(row % 12 + 1, 1990 + row // 12)
+        if quote:
+            date = '"' + date + '"'
+            cells = ['"' + cell + '"' for cell in cells]
+        lines.append("," + date + "," + ",".join(cells))
+    path.write_bytes((newline.join(lines) + newline).encode())
+    return path
+
+
+def assert_matches_reference(path, block_size=64):
+    store = read_return_csv(str(path), block_size=block_size)
+    header, dates, returns = reference(path)
+    assert store.dates == dates
+    np.testing.assert_array_equal(store.returns, returns)
+    np.testing.assert_allclose(store.growth, returns / 100 + 1)
+    return store, header
+
+
+@pytest.mark.parametrize("block_size", [16, 64, 100, 1 << 20])
+def test_block_boundaries(tmp_path, block_size):
+    store, header = assert_matches_reference(write_export(tmp_path / "r.csv", 300), block_size)
+    assert store.columns == header == ["A", "B", "C"]
+    assert len(store) == 300
+
+
+def test_blank_cells(tmp_path):
+    path = write_export(tmp_path / "r.csv", 50)
+    lines = path.read_text().splitlines()
+    #an index without history yet, then a single missing value later on
+    for row in range(2, 20):
+        cells = lines[row].split(",")
+        cells[4] = ""
+        lines[row] = ",".join(cells)
+    cells = lines[30].split(",")
+    cells[2] = ""
+    lines[30] = ",".join(cells)
+    path.write_text("\n".join(lines) + "\n")
+    store, header = assert_matches_reference(path)
+    assert np.isnan(store.returns[:18, 2]).all() and np.isnan(store.returns[28, 0])
+    assert not np.isnan(store.returns[18:, 2]).any()
+
+
+def test_crlf_line_endings(tmp_path):
+    store, header = assert_matches_reference(write_export(tmp_path / "r.csv", 120, newline="\r\n"))
+    assert store.columns == ["A", "B", "C"]
+    assert all("\r" not in date for date in store.dates)
+
+
+def test_quoted_fields(tmp_path):
+    store, header = assert_matches_reference(write_export(tmp_path / "r.csv", 80, quote=True))
+    assert store.dates[0] == "1/28/1990"
+
+
+def test_no_header(tmp_path):
+    store, header = assert_matches_reference(write_export(tmp_path / "r.csv", 40, header=None))
+    assert header is None
+    assert store.columns == ["column 2", "column 3", "column 4"]
+
+
+def test_asset_column_selection(tmp_path):
+    path = write_export(tmp_path / "r.csv", 40, header=("A", "B", "C", "", ""))
+    header, dates, returns = reference(path)
+    assert read_return_csv(str(path)).columns == ["A", "B", "C"]
+    np.testing.assert_array_equal(read_return_csv(str(path), 2).returns, returns[:, :2])
+    np.testing.assert_array_equal(read_return_csv(str(path), ["C", "A"]).returns, returns[:, [2, 0]])
+    with pytest.raises(ValueError):
+        read_return_csv(str(path), ["D"])
+
+
+@pytest.mark.parametrize("content", [b"", b",Date,A,B\n,,,\n"])
+def test_empty(tmp_path, content):
+    path = tmp_path / "r.csv"
+    path.write_bytes(content)
+    store = read_return_csv(str(path), block_size=16)
+    assert len(store) == 0
+    assert store.returns.shape[0] == 0
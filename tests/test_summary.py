@@ -0,0 +1,37 @@
+import numpy as np
+
+from returns_engine import QuantileDigest, RollingSummary
+
+QUANTILES = np.array([0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99])
+
+
+def test_digest_exact_below_exact_size():
+    values = np.random.default_rng(0).lognormal(size=1500)
+    digest = QuantileDigest()
+    for chunk in np.array_split(values, 7):
+        digest.update(chunk)
+    np.testing.assert_allclose(digest.quantile(QUANTILES, values.min(), values.max()), np.quantile(values, QUANTILES))
+
+
+def test_digest_close_to_np_quantile():
+    values = np.random.default_rng(1).lognormal(size=200000)
+    digest = QuantileDigest()
+    for chunk in np.array_split(values, 50):
+        digest.update(chunk)
+    estimates = digest.quantile(QUANTILES, values.min(), values.max())
+    #compare by rank, the share of values below each estimate
+    ranks = np.searchsorted(np.sort(values), estimates) / len(values)
+    np.testing.assert_allclose(ranks, QUANTILES, atol=0.005)
+    np.testing.assert_allclose(estimates, np.quantile(values, QUANTILES), rtol=0.02)
+
+
+def test_rolling_summary_matches_numpy():
+    values = np.random.default_rng(2).normal(100, 20, size=(3000, 3))
+    summary = RollingSummary(["a", "b", "c"])
+    for chunk in np.array_split(values, 9):
+        summary.update(chunk)
+    np.testing.assert_allclose(summary.mean, values.mean(axis=0))
+    np.testing.assert_allclose(summary.std(), values.std(axis=0, ddof=1))
+    np.testing.assert_allclose(summary.minimum, values.min(axis=0))
+    np.testing.assert_allclose(summary.maximum, values.max(axis=0))
+    np.testing.assert_allclose(summary.quantile(0.5), np.median(values, axis=0), rtol=0.01)